@@ -1,31 +1,1066 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import os
+import io
+import sys
+import time
+import queue
+import hashlib
+import importlib.util
+import json
+import sqlite3
+import warnings
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from llm_gateway import LLMGateway, LLMUnavailable
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    guess_datetime_format = None
+# matplotlib, Altair and openai are imported on first use, so the upload screen paints without them.
+# Charts are rendered off-screen; set before matplotlib is ever imported.
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_FALLBACK_MODELS = [model for model in os.getenv("QUICKINSIGHT_LLM_FALLBACK_MODELS", "").split(",") if model]
+LLM_WORKERS = int(os.getenv("QUICKINSIGHT_LLM_WORKERS", "8"))
+LLM_CONCURRENCY = int(os.getenv("QUICKINSIGHT_LLM_CONCURRENCY", "4"))  # calls in flight per process
+LLM_RPM = int(os.getenv("QUICKINSIGHT_LLM_RPM", "500"))
+LLM_TPM = int(os.getenv("QUICKINSIGHT_LLM_TPM", "200000"))
+LLM_TIMEOUT = float(os.getenv("QUICKINSIGHT_LLM_TIMEOUT", "60"))  # seconds without a response byte
+LLM_RETRIES = int(os.getenv("QUICKINSIGHT_LLM_RETRIES", "4"))  # per model
+CACHE_DIR = os.getenv("QUICKINSIGHT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".quickinsight_cache"))
+PARQUET_CACHE_DIR = os.path.join(CACHE_DIR, "parquet")
+SHEET_CACHE_MB = int(os.getenv("QUICKINSIGHT_SHEET_CACHE_MB", "1024"))
+PARQUET_CACHE_MB = int(os.getenv("QUICKINSIGHT_PARQUET_CACHE_MB", "4096"))
+LLM_CACHE_MB = int(os.getenv("QUICKINSIGHT_LLM_CACHE_MB", "64"))
+LLM_CACHE_TTL = int(os.getenv("QUICKINSIGHT_LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+DATE_SAMPLE_SIZE = 500
+PLOT_MAX_POINTS = 2000
+# "altair" sends the chart data to the browser as a Vega-Lite spec; "matplotlib" renders PNGs on the server
+CHART_BACKEND = os.getenv("QUICKINSIGHT_CHART_BACKEND", "altair") if importlib.util.find_spec("altair") else "matplotlib"
+CHART_RESOLUTIONS = {"All points": None, "Day": "D", "Week": "W", "Month": "MS"}
+STAGE_CACHE_MB = int(os.getenv("QUICKINSIGHT_STAGE_CACHE_MB", "512"))
+SUMMARY_MAX_PERIODS = 60
+SUMMARY_TOP_K = 10
+SUMMARY_MAX_COLUMNS = 40
+DATE_MIN_PARSED = 0.5  # share of non-empty values that must parse for a column to count as dates
+# Text columns with at most this share of distinct values, and at most CATEGORY_MAX_UNIQUE of them, are stored as
+# category; above that the categories themselves cost more than they save
+CATEGORY_MAX_RATIO = 0.05
+CATEGORY_MAX_UNIQUE = 50_000
+SESSION_MEMORY_MB = int(os.getenv("QUICKINSIGHT_SESSION_MEMORY_MB", "1024"))
+LOAD_MEMORY_FACTOR = 2  # reading peaks at about twice the data's size: the frame as parsed plus its compacted copy
+TIMING_PANEL = os.getenv("QUICKINSIGHT_TIMING_PANEL", "") == "1"  # developer sidebar with each run's timings
+TRACE_LOG = os.getenv("QUICKINSIGHT_TRACE_LOG")  # spans are appended here as JSON lines when set
+# Group totals are kept on disk and, when a new upload only appends rows to one seen before, updated from the new rows
+INCREMENTAL = os.getenv("QUICKINSIGHT_INCREMENTAL", "") == "1"
+AGGREGATE_DIR = os.path.join(CACHE_DIR, "aggregates")
+AGGREGATE_SNAPSHOTS = 3  # kept per dataset and (category, metric) pair
+PREFIX_BLOCK_ROWS = 65536  # rows per link of the chained hash that recognises an earlier upload inside a new one
+PARTIAL_STATS = ("count", "sum", "mean", "min", "max")
+
+
+# LRU cache bounded by the total size of its values, shared by every session in this process
+class LRUCache:
+    def __init__(self, max_bytes, sizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def size_of(self, key):
+        with self.lock:
+            return self.entries[key][1] if key in self.entries else 0
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return value
+
+
+def nbytes(value):
+    if isinstance(value, dict):
+        return len(json.dumps(value, default=str))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+@st.cache_resource
+def get_sheet_cache():
+    return LRUCache(SHEET_CACHE_MB * 1024 ** 2, nbytes)
+
+
+# Persistent cache of model responses keyed on (model, prompt hash), with TTL and size-based eviction.
+# Identical requests already in flight are coalesced: followers wait for the leader's answer.
+class ResponseCache:
+    def __init__(self, path, ttl, max_bytes):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, created REAL, accessed REAL)"
+            )
+
+    @staticmethod
+    def make_key(model, prompt):
+        return hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        size = len(response.encode())
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, size, now, now)
+            )
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            excess = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] - self.max_bytes
+            if excess > 0:
+                evict = []
+                for old_key, old_size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    evict.append((old_key,))
+                    excess -= old_size
+                self.conn.executemany("DELETE FROM responses WHERE key = ?", evict)
+
+    def get_or_compute(self, model, prompt, compute):
+        key = self.make_key(model, prompt)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            # The previous leader may have finished between our cache miss and taking the lead
+            response = self.get(key)
+            if response is None:
+                response = compute()
+                self.put(key, model, response)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                self.inflight.pop(key, None)
+
+
+@st.cache_resource
+def get_response_cache():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return ResponseCache(os.path.join(CACHE_DIR, "llm_responses.sqlite"), LLM_CACHE_TTL, LLM_CACHE_MB * 1024 ** 2)
+
+
+@st.cache_resource
+def get_llm_gateway():
+    return LLMGateway([LLM_MODEL] + LLM_FALLBACK_MODELS, api_key=os.getenv("OPENAI_API_KEY"),
+                      max_concurrency=LLM_CONCURRENCY, requests_per_minute=LLM_RPM, tokens_per_minute=LLM_TPM,
+                      timeout=LLM_TIMEOUT, max_retries=LLM_RETRIES)
+
+
+@st.cache_resource
+def get_llm_executor():
+    return ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="insight")
+
+
+# A model answer being produced in the background; text arrives on the queue as it streams in,
+# followed by None when done (or the exception that stopped it)
+class PendingInsight:
+    def __init__(self):
+        self.chunks = queue.Queue()
+        self.streamed = False
+
+    def tokens(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+# Start the model request on the background executor as soon as the prompt is known, so it runs while
+# the page renders charts. The answer is cached even if the user moves on before it finishes.
+def start_insight(prompt, model=LLM_MODEL):
+    pending = PendingInsight()
+    cache = get_response_cache()
+    # The worker thread cannot see session state, so it records into this run's trace directly
+    trace = current_trace()
+    gateway = get_llm_gateway()
+    models = [model] + [fallback for fallback in LLM_FALLBACK_MODELS if fallback != model]
+
+    def request():
+        with trace.span("llm_request", model=model, prompt_chars=len(prompt)) as attrs:
+            start = time.perf_counter()
+            stats = {}
+            parts = []
+            try:
+                for text in gateway.stream_chat([{"role": "user", "content": prompt}], models, stats):
+                    if not parts:
+                        attrs["first_token_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    parts.append(text)
+                    pending.streamed = True
+                    pending.chunks.put(text)
+            finally:
+                attrs.update(attempts=stats.get("attempts"), answered_by=stats.get("model"))
+                if stats.get("usage"):
+                    usage = stats["usage"]
+                    attrs.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+                                 total_tokens=usage.total_tokens)
+            return "".join(parts)
+
+    def run():
+        try:
+            with trace.span("insight", model=model) as attrs:
+                insight = cache.get_or_compute(model, prompt, request)
+                # Cache hits and coalesced requests never reach request()
+                attrs["cached"] = not pending.streamed
+            # Cache hits and coalesced requests arrive all at once
+            if not pending.streamed:
+                pending.chunks.put(insight)
+            pending.chunks.put(None)
+        except Exception as e:
+            pending.chunks.put(e)
+
+    get_llm_executor().submit(run)
+    return pending
+
+
+def render_insight(pending):
+    try:
+        with current_trace().span("render_insight"):
+            st.write_stream(pending.tokens())
+    except LLMUnavailable as e:
+        st.warning(f"The AI analysis is unavailable right now, please try again in a minute. ({e})")
+    except Exception as e:
+        st.error(f"Error querying OpenAI: {e}")
 
 
-import openai
-import os
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Content hash of an upload, computed once per file per session
+def upload_digest(uploaded_file):
+    key = f"digest_{getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)}"
+    if key not in st.session_state:
+        st.session_state[key] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return st.session_state[key]
+
+
+def file_kind(name):
+    ext = os.path.splitext(name)[1].lower().lstrip(".")
+    return "excel" if ext in ("xlsx", "xls") else "arrow" if ext == "feather" else ext
+
+
+def load_sheet_names(uploaded_file, digest):
+    cache = get_sheet_cache()
+    sheet_names = cache.get((digest, None))
+    if sheet_names is None:
+        path = os.path.join(PARQUET_CACHE_DIR, f"{digest}.sheets.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                sheet_names = json.load(f)
+        else:
+            sheet_names = pd.ExcelFile(io.BytesIO(uploaded_file.getvalue())).sheet_names
+            os.makedirs(PARQUET_CACHE_DIR, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(sheet_names, f)
+        cache.put((digest, None), sheet_names)
+    return sheet_names
+
+
+def parquet_cache_path(digest, sheet):
+    return os.path.join(PARQUET_CACHE_DIR, f"{digest}_{hashlib.sha256(str(sheet).encode()).hexdigest()[:16]}.parquet")
+
+
+# One-time conversion of a workbook sheet to Parquet; later sessions read just the columns they need from it
+def convert_sheet_to_parquet(uploaded_file, digest, sheet):
+    path = parquet_cache_path(digest, sheet)
+    if not os.path.exists(path):
+        with current_trace().span("read_excel", sheet=str(sheet)) as attrs:
+            frame = pd.read_excel(io.BytesIO(uploaded_file.getvalue()), sheet_name=sheet)
+            attrs["rows"] = len(frame)
+        os.makedirs(PARQUET_CACHE_DIR, exist_ok=True)
+        try:
+            frame.to_parquet(path + ".tmp", index=False)
+        except (ValueError, TypeError):
+            # Columns mixing text and numbers cannot be stored as-is; keep them as text
+            text_cols = frame.select_dtypes(include="object").columns
+            frame.astype({col: "string" for col in text_cols}).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        prune_parquet_cache()
+    return path
+
+
+def prune_parquet_cache():
+    files = [os.path.join(PARQUET_CACHE_DIR, name) for name in os.listdir(PARQUET_CACHE_DIR) if name.endswith(".parquet")]
+    files.sort(key=os.path.getmtime, reverse=True)
+    total = 0
+    for path in files:
+        total += os.path.getsize(path)
+        if total > PARQUET_CACHE_MB * 1024 ** 2:
+            os.remove(path)
+
+
+# Column names without parsing the data: Parquet/Arrow schema, CSV header, or the converted sheet's schema
+def load_column_names(uploaded_file, digest, kind, sheet):
+    cache = get_sheet_cache()
+    columns = cache.get((digest, sheet, "columns"))
+    if columns is None:
+        source = io.BytesIO(uploaded_file.getvalue())
+        if kind == "excel":
+            columns = pq.read_schema(convert_sheet_to_parquet(uploaded_file, digest, sheet)).names
+        elif kind == "csv":
+            columns = pd.read_csv(source, nrows=0).columns.tolist()
+        elif kind == "parquet":
+            columns = pq.read_schema(source).names
+        else:
+            columns = pa.ipc.open_file(source).schema.names
+        columns = cache.put((digest, sheet, "columns"), [col for col in columns if not col.startswith("__index_level_")])
+    return columns
+
+
+# Rough bytes reading these columns will take, known before anything is parsed: uncompressed column sizes from the
+# Parquet metadata (workbook sheets are already converted to Parquet to list their columns), otherwise the selected
+# columns' share of the file
+def estimate_table_bytes(uploaded_file, digest, kind, sheet, columns):
+    if kind in ("excel", "parquet"):
+        source = convert_sheet_to_parquet(uploaded_file, digest, sheet) if kind == "excel" else \
+            io.BytesIO(uploaded_file.getvalue())
+        metadata = pq.ParquetFile(source).metadata
+        wanted = set(columns)
+        # At least 8 bytes a value: dictionary-encoded text is stored far smaller than it takes once read
+        size = sum(
+            max(group.column(i).total_uncompressed_size, 8 * group.column(i).num_values)
+            for group in (metadata.row_group(r) for r in range(metadata.num_row_groups))
+            for i in range(group.num_columns) if group.column(i).path_in_schema in wanted
+        )
+    else:
+        all_columns = load_column_names(uploaded_file, digest, kind, sheet)
+        size = uploaded_file.size * len(columns) / max(len(all_columns), 1)
+    return int(size * LOAD_MEMORY_FACTOR)
+
+
+def read_table(uploaded_file, digest, kind, sheet, columns):
+    if kind == "excel":
+        return pd.read_parquet(convert_sheet_to_parquet(uploaded_file, digest, sheet), columns=columns)
+    source = io.BytesIO(uploaded_file.getvalue())
+    if kind == "csv":
+        return pd.read_csv(source, usecols=columns)[columns]
+    if kind == "parquet":
+        return pd.read_parquet(source, columns=columns)
+    return pd.read_feather(source, columns=columns)
+
+
+# Loaded tables are cached by (content hash, sheet, columns), so widget changes never re-read the file
+def load_table(uploaded_file, digest, kind, sheet, columns):
+    cache = get_sheet_cache()
+    key = (digest, sheet, tuple(columns))
+    with current_trace().span("load_table", kind=kind, columns=len(columns)) as attrs:
+        df = cache.get(key)
+        attrs["cached"] = df is not None
+        if df is None:
+            # Refused up front: once read_table has run, the memory is already taken
+            estimate = estimate_table_bytes(uploaded_file, digest, kind, sheet, columns)
+            attrs["estimated_bytes"] = estimate
+            if sum(st.session_state.get("memory_usage", {}).values()) + estimate > SESSION_MEMORY_MB * 1024 ** 2:
+                st.error(f"Loading these columns would take about {estimate / 1024 ** 2:,.0f} MB, more than the "
+                         f"{SESSION_MEMORY_MB} MB allowed per session. Load fewer columns under 'Columns to load' "
+                         "or use a smaller file.")
+                st.stop()
+            with current_trace().span("read_table"):
+                raw = read_table(uploaded_file, digest, kind, sheet, columns)
+            with current_trace().span("compact_dtypes"):
+                df = compact_dtypes(raw)
+            df.attrs["fingerprint"] = key
+            df.attrs["loaded_table"] = key
+            df.attrs["raw_bytes"] = nbytes(raw)
+            del raw
+            cache.put(key, df)
+        attrs["rows"] = len(df)
+    account_memory("Loaded table", key, cache.size_of(key) or nbytes(df))
+    # A shallow copy keeps any column assignment by the caller off the cached frame
+    return df.copy(deep=False)
+
+
+# Smaller dtypes for a freshly loaded table: integers narrowed to the smallest type that holds them and repetitive
+# text columns stored as category. Floats stay float64, since sums and means over float32 lose precision
+def compact_dtypes(df):
+    compact = {}
+    for col in df.columns:
+        series = df[col]
+        if not isinstance(series.dtype, np.dtype) and not isinstance(series.dtype, pd.StringDtype):
+            continue
+        if series.dtype.kind in "iu":
+            narrowed = pd.to_numeric(series, downcast="integer" if series.dtype.kind == "i" else "unsigned")
+            if narrowed.dtype != series.dtype:
+                compact[col] = narrowed
+        elif series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+            if len(series) and series.nunique() <= min(CATEGORY_MAX_RATIO * len(series), CATEGORY_MAX_UNIQUE):
+                compact[col] = series.astype("category")
+    if not compact:
+        return df
+    df = df.copy(deep=False)
+    for col, series in compact.items():
+        df[col] = series
+    return df
+
+
+# Resampling keeps narrow dtypes, so compacted numeric columns are widened before sums can overflow them
+def widened(frame):
+    return frame.astype({
+        col: np.float64 if frame[col].dtype.kind == "f" else np.int64
+        for col in frame.columns
+        if isinstance(frame[col].dtype, np.dtype) and frame[col].dtype.kind in "iuf" and frame[col].dtype.itemsize < 8
+    })
+
+
+# Bytes this session touched during the current run: its table plus the cached stages it used, each cache key
+# counted once however often the run reads it. The numbers are reset at the top of every run.
+def account_memory(label, key, size):
+    counted = st.session_state.setdefault("memory_counted", set())
+    if key in counted:
+        return
+    counted.add(key)
+    usage = st.session_state.setdefault("memory_usage", {})
+    usage[label] = usage.get(label, 0) + size
+    if sum(usage.values()) > SESSION_MEMORY_MB * 1024 ** 2:
+        show_memory_usage()
+        st.error(f"This analysis needs more than the {SESSION_MEMORY_MB} MB allowed per session. "
+                 "Load fewer columns under 'Columns to load' or use a smaller file.")
+        st.stop()
+
+
+def show_memory_usage(df=None):
+    usage = st.session_state.get("memory_usage", {})
+    total = sum(usage.values())
+    st.sidebar.subheader("Memory")
+    st.sidebar.metric("This session", f"{total / 1024 ** 2:,.1f} MB", help=f"Limit: {SESSION_MEMORY_MB:,} MB")
+    st.sidebar.progress(min(total / max(SESSION_MEMORY_MB * 1024 ** 2, 1), 1.0))
+    for label, size in sorted(usage.items(), key=lambda item: -item[1]):
+        st.sidebar.caption(f"{label}: {size / 1024 ** 2:,.2f} MB")
+    if df is not None and "raw_bytes" in df.attrs:
+        st.sidebar.caption(f"Table compacted from {df.attrs['raw_bytes'] / 1024 ** 2:,.1f} MB")
+    sheet_cache, stage_cache = get_sheet_cache(), get_stage_cache()
+    st.sidebar.caption(f"Shared caches: {(sheet_cache.total_bytes + stage_cache.total_bytes) / 1024 ** 2:,.1f} MB "
+                       f"of {(sheet_cache.max_bytes + stage_cache.max_bytes) / 1024 ** 2:,.0f} MB")
+
+
+# Timings for one script run. Spans nest per thread and record when they started relative to the run;
+# extra details (rows, cache hits, token counts) go in the dict the span yields.
+class Trace:
+    log_lock = threading.Lock()
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        stack = self.local.__dict__.setdefault("stack", [])
+        record = {"run": self.run_id, "name": name, "parent": stack[-1] if stack else None, "depth": len(stack),
+                  "thread": threading.current_thread().name, "attrs": attrs}
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            record["start_ms"] = round((start - self.started) * 1000, 3)
+            record["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            with self.lock:
+                self.spans.append(record)
+            if TRACE_LOG:
+                with Trace.log_lock, open(TRACE_LOG, "a") as f:
+                    f.write(json.dumps(dict(record, ts=time.time()), default=str) + "\n")
+
+
+# The trace of the run in progress; each run of the script starts a new one
+def current_trace():
+    if "trace" not in st.session_state:
+        st.session_state["trace"] = Trace()
+    return st.session_state["trace"]
+
+
+def show_timings():
+    trace = current_trace()
+    with trace.lock:
+        spans = sorted(trace.spans, key=lambda span: span["start_ms"])
+    st.sidebar.subheader("Timings")
+    st.sidebar.metric("This run", f"{(time.perf_counter() - trace.started) * 1000:,.0f} ms", help=f"Run {trace.run_id}")
+    st.sidebar.dataframe(pd.DataFrame({
+        "stage": ["\u2003" * span["depth"] + span["name"] for span in spans],
+        "ms": [span["ms"] for span in spans],
+        "details": [", ".join(f"{key}={value}" for key, value in span["attrs"].items()) for span in spans],
+    }), hide_index=True)
+
+
+# Stable identity for a frame: the upload or pipeline stage it came from, or else a hash of its contents
+def frame_fingerprint(df):
+    if "fingerprint" not in df.attrs:
+        df.attrs["fingerprint"] = (tuple(map(str, df.columns)), int(pd.util.hash_pandas_object(df).sum()))
+    return df.attrs["fingerprint"]
+
+
+@st.cache_resource
+def get_date_column_cache():
+    return LRUCache(16 * 1024 ** 2, sys.getsizeof)
+
+
+@st.cache_resource
+def get_stage_cache():
+    return LRUCache(STAGE_CACHE_MB * 1024 ** 2, nbytes)
+
+
+# Pipeline stages run once per (stage, dataset fingerprint, parameters) and are reused across reruns and sessions.
+# A stage that derives a new frame gives it a fingerprint of its own, so later stages are keyed off that one
+# and changing a selection only recomputes what depends on it.
+def cached_stage(name, data, params, compute):
+    key = (name, frame_fingerprint(data)) + tuple(params)
+    cache = get_stage_cache()
+    with current_trace().span(name) as attrs:
+        result = cache.get(key)
+        attrs["cached"] = result is not None
+        if result is None:
+            result = compute()
+            if isinstance(result, (pd.DataFrame, pd.Series)):
+                result.attrs["fingerprint"] = key
+            result = cache.put(key, result)
+    account_memory(f"Stage: {name}", key, cache.size_of(key))
+    return result
+
+
+# Rows with the date column parsed; rows that do not parse are dropped
+def with_parsed_dates(data, x_col):
+    def parse():
+        parsed = data.copy(deep=False)
+        parsed[x_col] = to_dates(data[x_col])
+        return parsed.dropna(subset=[x_col])
+    return cached_stage("dates", data, (x_col,), parse)
+
+
+# Text columns with at most max_unique distinct values
+def category_columns(data, max_unique):
+    return cached_stage("categories", data, (max_unique,), lambda: [
+        col for col in data.columns
+        if (data[col].dtype == 'object' or isinstance(data[col].dtype, (pd.StringDtype, pd.CategoricalDtype)))
+        and data[col].nunique() <= max_unique
+    ])
+
+
+def group_stat(data, category_col, cols, how):
+    if how not in PARTIAL_STATS or not incremental_table(data):
+        return cached_stage("groupby", data, (category_col, tuple(np.atleast_1d(cols)), how),
+                            lambda: data.groupby(category_col, observed=True)[cols].agg(how))
+
+    partials = {col: group_partials(data, category_col, col) for col in np.atleast_1d(cols)}
+    reused = min(partial.attrs["reused_rows"] for partial in partials.values())
+    if reused:
+        st.caption(f"Totals by '{category_col}' reuse {reused:,} rows from an earlier upload of this data; "
+                   f"only the {len(data) - reused:,} new rows were aggregated.")
+
+    def compute():
+        stats = pd.DataFrame({col: partial_stat(partial, how) for col, partial in partials.items()})
+        return stats[cols] if np.ndim(cols) == 0 else stats
+    return cached_stage("groupby", data, (category_col, tuple(np.atleast_1d(cols)), how), compute)
+
+
+# Incremental refresh works on tables exactly as loaded; frames derived from them (parsed dates, filters) carry the
+# attrs along but get a fingerprint of their own
+def incremental_table(data):
+    return INCREMENTAL and len(data) > 0 and data.attrs.get("loaded_table", False) == data.attrs.get("fingerprint")
+
+
+# Column names and whether each is numeric; compaction may pick different dtypes once the data grows
+def schema_key(data):
+    kinds = [[str(col), "number" if pd.api.types.is_numeric_dtype(data[col]) else "other"] for col in data.columns]
+    return hashlib.sha256(json.dumps(kinds).encode()).hexdigest()[:16]
+
+
+# Hashes of every row, widened so compaction's dtype choices do not change them, and the chain of digests over
+# whole blocks of rows: link k is sha256(link k-1 + row hashes of block k), link 0 is empty
+def prefix_chain(data):
+    def compute():
+        rows = pd.util.hash_pandas_object(widened(data), index=False).to_numpy()
+        links = [b""]
+        for start in range(0, len(rows) - PREFIX_BLOCK_ROWS + 1, PREFIX_BLOCK_ROWS):
+            links.append(hashlib.sha256(links[-1] + rows[start:start + PREFIX_BLOCK_ROWS].tobytes()).digest())
+        return rows, links
+    return cached_stage("prefix_hash", data, (), compute)
+
+
+# Hash of all of the first `rows` rows: the chain up to the last whole block, extended by the rows after it.
+# Any edit inside the prefix changes it, and the chain is built once per table for every prefix length.
+def prefix_hash(data, rows):
+    row_hashes, links = prefix_chain(data)
+    blocks = rows // PREFIX_BLOCK_ROWS
+    tail = row_hashes[blocks * PREFIX_BLOCK_ROWS:rows]
+    return hashlib.sha256(links[blocks] + tail.tobytes()).hexdigest()[:16]
+
+
+# Mergeable totals of one metric per group: count, sum, sum of squares, min and max.
+# A snapshot is saved for every dataset seen. When an earlier snapshot's rows are the start of this dataset,
+# its totals are merged with totals of the remaining rows instead of aggregating everything again.
+def group_partials(data, category_col, col):
+    def compute():
+        with current_trace().span("partials", column=str(col)) as attrs:
+            prefix = schema_key(data) + "_"
+            suffix = "_" + hashlib.sha256(json.dumps([str(category_col), str(col)]).encode()).hexdigest()[:16] + ".parquet"
+            os.makedirs(AGGREGATE_DIR, exist_ok=True)
+            snapshots = sorted(
+                ((int(name[len(prefix):-len(suffix)].split("_")[0]), name) for name in os.listdir(AGGREGATE_DIR)
+                 if name.startswith(prefix) and name.endswith(suffix)),
+                reverse=True,
+            )
+            reused, partials = 0, None
+            for rows, name in snapshots:
+                if rows <= len(data) and name == f"{prefix}{rows}_{prefix_hash(data, rows)}{suffix}":
+                    partials = pd.read_parquet(os.path.join(AGGREGATE_DIR, name))
+                    reused = rows
+                    break
+            if reused < len(data):
+                new = aggregate_groups(data.iloc[reused:], category_col, col)
+                partials = new if partials is None else merge_partials(partials, new)
+                save_partials(partials, f"{prefix}{len(data)}_{prefix_hash(data, len(data))}{suffix}",
+                              [name for _, name in snapshots])
+            partials.attrs["reused_rows"] = reused
+            attrs.update(reused_rows=reused, new_rows=len(data) - reused)
+            return partials
+    return cached_stage("partials", data, (category_col, col), compute)
+
+
+def aggregate_groups(rows, category_col, col):
+    values = widened(rows[[col]])[col]
+    keys = rows[category_col]
+    partials = values.groupby(keys, observed=True).agg(["count", "sum", "min", "max"])
+    partials["sumsq"] = values.astype(np.float64).pow(2).groupby(keys, observed=True).sum()
+    # Stored as text so groups line up however the category column was compacted
+    partials.index = partials.index.astype(str)
+    return partials
+
+
+def merge_partials(old, new):
+    both = pd.concat([old, new])
+    return both.groupby(level=0, sort=False).agg({"count": "sum", "sum": "sum", "sumsq": "sum", "min": "min", "max": "max"})
+
+
+def save_partials(partials, name, older):
+    path = os.path.join(AGGREGATE_DIR, name)
+    partials.to_parquet(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    # The largest snapshots are the likeliest starts of tomorrow's upload
+    for stale in older[AGGREGATE_SNAPSHOTS - 1:]:
+        if stale != name and os.path.exists(os.path.join(AGGREGATE_DIR, stale)):
+            os.remove(os.path.join(AGGREGATE_DIR, stale))
+
+
+def partial_stat(partials, how):
+    if how == "mean":
+        result = partials["sum"] / partials["count"].where(partials["count"] > 0)
+    else:
+        result = partials[how]
+    return result.sort_index()
+
+
+# Most recent row for each item
+def latest_per_group(data, item_col, date_col):
+    return cached_stage("latest", data, (item_col, date_col),
+                        lambda: data.sort_values(by=date_col).groupby(item_col, observed=True).tail(1))
+
+
+# A chart is a small long-form frame (x, series, value) plus labels. It is rendered once per
+# (dataset, chart parameters, backend) and reused: as a Vega-Lite spec or as PNG bytes.
+def show_chart(data, params, build):
+    def render():
+        chart = build()
+        return altair_spec(chart) if CHART_BACKEND == "altair" else matplotlib_png(chart)
+    result = cached_stage("chart", data, params + (CHART_BACKEND,), render)
+    with current_trace().span("send_chart", backend=CHART_BACKEND):
+        if CHART_BACKEND == "altair":
+            st.vega_lite_chart(result)
+        else:
+            st.image(result)
+
+
+def long_frame(wide):
+    wide = wide.to_frame() if isinstance(wide, pd.Series) else wide
+    return pd.DataFrame({
+        "x": np.tile(wide.index.to_numpy(), wide.shape[1]),
+        "series": np.repeat(wide.columns.astype(str).to_numpy(), len(wide)),
+        "value": wide.to_numpy(dtype=float, na_value=np.nan).T.ravel(),
+    })
+
+
+def bar_chart(wide, title, xlabel, ylabel, legend=False, color=None):
+    return {"kind": "bar", "frame": long_frame(wide), "title": title, "xlabel": xlabel, "ylabel": ylabel,
+            "legend": legend, "color": color}
+
+
+def load_altair():
+    import altair as alt
+    # Chart data is aggregated and downsampled before it reaches Altair
+    alt.data_transformers.disable_max_rows()
+    return alt
+
+
+def altair_spec(chart):
+    alt = load_altair()
+    frame = chart["frame"]
+    line = chart["kind"] == "line"
+    encoding = {
+        "x": alt.X("x:T" if line else "x:N", title=chart["xlabel"], sort=None),
+        "y": alt.Y("value:Q", title=chart["ylabel"]),
+        "color": alt.Color("series:N", title=None) if chart["legend"] else alt.value(chart["color"] or "steelblue"),
+        "tooltip": [alt.Tooltip("x:T" if line else "x:N", title=chart["xlabel"] or "x"),
+                    alt.Tooltip("series:N", title="series"), alt.Tooltip("value:Q", title=chart["ylabel"])],
+    }
+    if line:
+        # Zoom and pan along x happen in the browser
+        spec = alt.Chart(frame).mark_line().encode(**encoding).interactive(bind_y=False)
+    else:
+        if frame["series"].nunique() > 1:
+            encoding["xOffset"] = alt.XOffset("series:N")
+        spec = alt.Chart(frame).mark_bar().encode(**encoding)
+    return spec.properties(title=chart["title"], width="container").to_dict()
+
+
+def matplotlib_png(chart):
+    import matplotlib.pyplot as plt
+    frame = chart["frame"]
+    fig, ax = plt.subplots()
+    try:
+        if chart["kind"] == "line":
+            for name, series in frame.groupby("series", sort=False):
+                ax.plot(series["x"], series["value"], label=name)
+        else:
+            wide = frame.pivot(index="x", columns="series", values="value")
+            wide = wide.reindex(index=frame["x"].unique(), columns=frame["series"].unique())
+            wide.plot(kind="bar", ax=ax, legend=False, color=chart["color"])
+        ax.set_title(chart["title"])
+        ax.set_ylabel(chart["ylabel"])
+        if chart["xlabel"]:
+            ax.set_xlabel(chart["xlabel"])
+        if chart["legend"]:
+            ax.legend()
+        ax.grid(True)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        # Figures are never left to pyplot's global registry, which would keep them alive across reruns
+        plt.close(fig)
+
+
+def plot_bars(data, grouped, title, xlabel, ylabel, legend=False):
+    show_chart(data, ("bar", frame_fingerprint(grouped), title, xlabel, ylabel, legend),
+               lambda: bar_chart(grouped, title, xlabel, ylabel, legend=legend))
 
 #Function to see if Excel column is a date column
 def detect_date_columns(df):
-    date_keywords = ["date", "month", "year", "time", "timestamp", "day", "quarter"]
+    cache = get_date_column_cache()
+    fingerprint = frame_fingerprint(df)
     likely_date_cols = []
 
-    for col in df.columns:
-        col_lower = col.lower()
-        if any(keyword in col_lower for keyword in date_keywords):
-            likely_date_cols.append(col)
-        elif pd.api.types.is_datetime64_any_dtype(df[col]):
-            likely_date_cols.append(col)
-        elif pd.api.types.is_object_dtype(df[col]):
-            try:
-                converted = pd.to_datetime(df[col], errors="coerce")
-                if converted.notna().sum() > 0:
-                    likely_date_cols.append(col)
-            except:
-                continue
-    return list(set(likely_date_cols))
+    with current_trace().span("detect_date_columns", columns=len(df.columns)) as attrs:
+        tested = 0
+        for col in df.columns:
+            # dtype is part of the key because analyses convert the chosen column in place
+            key = (fingerprint, col, str(df[col].dtype), len(df))
+            is_date = cache.get(key)
+            if is_date is None:
+                is_date = cache.put(key, looks_like_date_column(col, df[col]))
+                tested += 1
+            if is_date:
+                likely_date_cols.append(col)
+        attrs["tested"] = tested
+    return likely_date_cols
+
+
+def looks_like_date_column(col, series):
+    date_keywords = ["date", "month", "year", "time", "timestamp", "day", "quarter"]
+    col_lower = str(col).lower()
+    if any(keyword in col_lower for keyword in date_keywords):
+        return True
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Each distinct value is tested once
+        series = pd.Series(series.cat.categories)
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return False
+
+    values = series.dropna()
+    if values.empty:
+        return False
+
+    # Cheap test on a random sample first; the whole column is only parsed when the sample looks like dates
+    sample = values.sample(min(len(values), DATE_SAMPLE_SIZE), random_state=0).astype(str)
+    fmt = infer_date_format(sample)
+    parsed = parse_dates(sample, fmt)
+    if fmt and parsed.notna().mean() < DATE_MIN_PARSED:
+        fmt = None
+        parsed = parse_dates(sample, fmt)
+    if parsed.notna().mean() < DATE_MIN_PARSED:
+        return False
+
+    return parse_dates(values.astype(str), fmt).notna().mean() >= DATE_MIN_PARSED
+
+
+# Parse a column as dates, using a format inferred from a sample so pandas can stay vectorized
+def to_dates(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Each distinct value is parsed once, then spread back over the rows
+        parsed = pd.DatetimeIndex(to_dates(pd.Series(column.cat.categories)))
+        return pd.Series(parsed.take(column.cat.codes.to_numpy(), allow_fill=True, fill_value=pd.NaT),
+                         index=column.index, name=column.name)
+    if pd.api.types.is_datetime64_any_dtype(column) or pd.api.types.is_numeric_dtype(column):
+        return parse_dates(column)
+    values = column.dropna()
+    fmt = infer_date_format(values.sample(min(len(values), DATE_SAMPLE_SIZE), random_state=0).astype(str))
+    parsed = parse_dates(column, fmt) if fmt else None
+    if parsed is None or parsed.notna().sum() < DATE_MIN_PARSED * len(values):
+        parsed = parse_dates(column)
+    return parsed
+
+
+# Most common format guessed from the first few sampled values
+def infer_date_format(sample):
+    if guess_datetime_format is None:
+        return None
+    guesses = [guess_datetime_format(value) for value in sample.iloc[:20]]
+    guesses = [fmt for fmt in guesses if fmt]
+    return max(set(guesses), key=guesses.count) if guesses else None
+
+
+# With an inferred format pandas parses vectorized; without one it falls back to dateutil per element
+def parse_dates(values, fmt=None):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        try:
+            return pd.to_datetime(values, format=fmt, errors="coerce")
+        except (ValueError, TypeError, OverflowError):
+            return pd.Series(pd.NaT, index=values.index)
+
+
+# Summaries sent to the model: bounded in size, but computed over every row rather than the first 200
+def summarize_data(data, x_col=None, y_cols=(), category_col=None, agg="sum"):
+    params = (x_col, tuple(y_cols), category_col, agg)
+    return cached_stage("summary", data, params, lambda: build_summary(data, x_col, list(y_cols), category_col, agg))
+
+
+def build_summary(data, x_col, y_cols, category_col, agg):
+    if x_col is None and category_col is not None and y_cols and agg in PARTIAL_STATS and incremental_table(data):
+        return summarize_partials(data, category_col, y_cols, agg)
+    sections = [f"Rows: {len(data):,}"]
+    if y_cols:
+        sections.append("Distribution of each metric:\n" + data[y_cols].describe().T.round(4).to_csv())
+    if x_col is not None and y_cols:
+        sections.append(summarize_time_series(data, x_col, y_cols, agg))
+    if category_col is not None and y_cols:
+        sections.append(summarize_groups(data, category_col, y_cols, agg))
+    if x_col is None and category_col is None and not y_cols:
+        sections.append(summarize_columns(data))
+    return "\n\n".join(sections)
+
+
+# Coarsest of hourly/daily/weekly/monthly/quarterly/yearly that keeps the series under SUMMARY_MAX_PERIODS
+def pick_frequency(start, end):
+    span = end - start
+    for freq, days in [("h", 1 / 24), ("D", 1), ("W", 7), ("MS", 30.44), ("QS", 91.31)]:
+        if span / pd.Timedelta(days=days) <= SUMMARY_MAX_PERIODS:
+            return freq
+    return "YS"
+
+
+def summarize_time_series(data, x_col, y_cols, agg):
+    series = widened(data[[x_col] + y_cols]).set_index(x_col)
+    start, end = series.index.min(), series.index.max()
+    freq = pick_frequency(start, end)
+    resampled = series.resample(freq).agg(agg).dropna(how="all")
+    text = (f"{agg.title()} per period ({freq}) from {start:%Y-%m-%d} to {end:%Y-%m-%d}:\n"
+            + resampled.round(4).to_csv(date_format="%Y-%m-%d %H:%M" if freq == "h" else "%Y-%m-%d"))
+
+    # Periods far from the median, by robust z-score (median absolute deviation).
+    # Thinly covered periods (usually the partial first and last ones) are left out.
+    rows = series.resample(freq).size().reindex(resampled.index)
+    covered = rows >= 0.9 * rows.median()
+    anomalies = []
+    for col in y_cols:
+        values = resampled.loc[covered, col].dropna()
+        mad = (values - values.median()).abs().median()
+        if len(values) < 5 or mad == 0:
+            continue
+        robust_z = 0.6745 * (values - values.median()) / mad
+        for period in robust_z[robust_z.abs() > 3.5].abs().nlargest(5).index:
+            direction = "above" if robust_z[period] > 0 else "below"
+            anomalies.append(f"{col} {period:%Y-%m-%d}: {values[period]:.4g}, well {direction} typical")
+    if anomalies:
+        text += "\nUnusual periods:\n" + "\n".join(anomalies)
+    return text
+
+
+def summarize_groups(data, category_col, y_cols, agg):
+    stats = data.groupby(category_col, observed=True)[y_cols].agg(["count", "sum", "mean", "min", "max"])
+    stats.columns = [f"{col}_{stat}" for col, stat in stats.columns]
+    return format_group_stats(stats, category_col, y_cols, agg)
+
+
+# The same summary built from group partials: quartiles cannot be merged, so the distribution has count, mean, std,
+# min and max only
+def summarize_partials(data, category_col, y_cols, agg):
+    partials = {col: group_partials(data, category_col, col) for col in y_cols}
+    distribution = {}
+    for col, partial in partials.items():
+        n, total = partial["count"].sum(), partial["sum"].sum()
+        variance = (partial["sumsq"].sum() - total * total / n) / (n - 1) if n > 1 else np.nan
+        distribution[col] = {"count": n, "mean": total / n if n else np.nan, "std": np.sqrt(max(variance, 0)),
+                             "min": partial["min"].min(), "max": partial["max"].max()}
+    stats = pd.concat({col: pd.DataFrame({"count": partial["count"], "sum": partial["sum"],
+                                          "mean": partial_stat(partial, "mean"), "min": partial["min"],
+                                          "max": partial["max"]})
+                       for col, partial in partials.items()}, axis=1).sort_index()
+    stats.columns = [f"{col}_{stat}" for col, stat in stats.columns]
+    return "\n\n".join([
+        f"Rows: {len(data):,}",
+        "Distribution of each metric:\n" + pd.DataFrame(distribution).T.round(4).to_csv(),
+        format_group_stats(stats, category_col, y_cols, agg),
+    ])
+
+
+def format_group_stats(stats, category_col, y_cols, agg):
+    stats = stats.sort_values(f"{y_cols[0]}_{agg}", ascending=False).round(4)
+    header = f"{len(stats)} groups in '{category_col}'"
+    if len(stats) > 2 * SUMMARY_TOP_K:
+        header += f", top and bottom {SUMMARY_TOP_K} by {agg} of {y_cols[0]}"
+        stats = pd.concat([stats.head(SUMMARY_TOP_K), stats.tail(SUMMARY_TOP_K)])
+    return header + ":\n" + stats.to_csv()
+
+
+# Overview for open-ended questions: column profile, numeric distributions, common values, a few example rows
+def summarize_columns(data):
+    data = data.iloc[:, :SUMMARY_MAX_COLUMNS]
+    profile = pd.DataFrame({
+        "dtype": data.dtypes.astype(str),
+        "missing": data.isna().sum(),
+        "unique": data.nunique(),
+    })
+    sections = [f"Columns ({len(profile)} shown):\n" + profile.to_csv()]
+
+    numeric = data.select_dtypes(include="number")
+    if not numeric.empty:
+        sections.append("Numeric columns:\n" + numeric.describe().T.round(4).to_csv())
+
+    common = []
+    for col in profile.index[(profile["unique"] <= 100) & ~profile["dtype"].str.contains("int|float")]:
+        counts = data[col].value_counts().head(5)
+        common.append(f"{col}: " + ", ".join(f"{value} ({count})" for value, count in counts.items()))
+    if common:
+        sections.append("Most common values:\n" + "\n".join(common))
+
+    sections.append("Example rows:\n" + data.head(10).to_csv(index=False))
+    return "\n\n".join(sections)
+
+
+# Line charts are drawn from at most PLOT_MAX_POINTS points per series, so render time does not grow with row count
+def plot_time_series(data, x_col, y_cols, title, ylabel, agg="sum"):
+    resolution = st.selectbox("Chart resolution", list(CHART_RESOLUTIONS))
+
+    def build():
+        series = widened(data[[x_col] + y_cols]).sort_values(x_col)
+        if CHART_RESOLUTIONS[resolution]:
+            series = series.set_index(x_col).resample(CHART_RESOLUTIONS[resolution]).agg(agg).reset_index()
+
+        x = series[x_col].to_numpy()
+        x_num = series[x_col].astype("int64").to_numpy(dtype=float)
+        frames = []
+        for col in y_cols:
+            y = series[col].to_numpy(dtype=float, na_value=np.nan)
+            valid = ~np.isnan(y)
+            keep = lttb_indices(x_num[valid], y[valid], PLOT_MAX_POINTS)
+            frames.append(pd.DataFrame({"x": x[valid][keep], "series": str(col), "value": y[valid][keep]}))
+        return {"kind": "line", "frame": pd.concat(frames, ignore_index=True), "title": title, "xlabel": x_col,
+                "ylabel": ylabel, "legend": True, "color": None}
+
+    show_chart(data, ("line", x_col, tuple(y_cols), resolution, agg, title, ylabel), build)
+
+
+# Largest-Triangle-Three-Buckets: keeps the first and last points and, from each bucket in between, the point
+# forming the largest triangle with the previous pick and the next bucket's average. Preserves peaks and dips.
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
 
 
 
@@ -42,8 +1077,7 @@ def track_sales_over_time(data):
         x_col = st.selectbox("Select the time column (X-axis)", date_cols, index=0)
 
     # Try parsing the selected X-axis column as datetime
-    data[x_col] = pd.to_datetime(data[x_col], errors='coerce')
-    data = data.dropna(subset=[x_col])
+    data = with_parsed_dates(data, x_col)
 
     if data[x_col].isna().all():
         st.error(f"The selected column '{x_col}' could not be parsed as dates. Please choose another.")
@@ -56,24 +1090,12 @@ def track_sales_over_time(data):
         st.info("Select at least one column to visualize.")
         return
 
-    fig, ax = plt.subplots()
-    for col in y_cols:
-        ax.plot(data[x_col], data[col], label=col)
-
-    ax.set_xlabel(x_col)
-    ax.set_ylabel("Sales")
-    ax.set_title("Sales Over Time")
-    ax.legend()
-    ax.grid(True)
-    st.pyplot(fig)
-    st.subheader("Analysis (Powered by AI, may take a couple of seconds to load):")
-
-    sample_data = data[[x_col] + y_cols].head(200).to_csv(index=False)
+    summary = summarize_data(data, x_col=x_col, y_cols=y_cols)
 
     prompt = f"""
     You are a data analyst. The user uploaded sales data.
 
-    Task: Analyze this sample of the sales data and return high-level business insights.
+    Task: Analyze this summary of the sales data and return high-level business insights.
     Use plain English. Focus on overall trends, interesting comparisons, or anomalies.
     Explain as if talking to a non-technical business user.
     
@@ -84,19 +1106,15 @@ def track_sales_over_time(data):
     perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        #st.subheader("AI-Generated Insight")
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    plot_time_series(data, x_col, y_cols, title="Sales Over Time", ylabel="Sales")
+    st.subheader("Analysis (Powered by AI, may take a couple of seconds to load):")
+
+    render_insight(pending)
 
 
 
@@ -104,7 +1122,7 @@ def compare_products_or_regions(data):
     st.subheader("Compare Products or Regions")
 
     # Detect categorical columns (objects with a small number of unique values)
-    categorical_cols = [col for col in data.columns if data[col].dtype == 'object' and data[col].nunique() <= 50]
+    categorical_cols = category_columns(data, 50)
     if not categorical_cols:
         st.warning("No suitable category columns found (e.g., product or region).")
         return
@@ -118,25 +1136,12 @@ def compare_products_or_regions(data):
         st.info("Please select at least one numeric column.")
         return
 
-    # Plotting
-    fig, ax = plt.subplots()
-    grouped = data.groupby(category_col)[y_cols].mean().sort_values(by=y_cols[0], ascending=False)
-    grouped.plot(kind='bar', ax=ax)
-    ax.set_title(f"Average Values by {category_col}")
-    ax.set_ylabel("Metric Values")
-    ax.set_xlabel(category_col)
-    ax.legend()
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a couple of seconds to load):")
-
-    sample_data = data[[category_col] + y_cols].head(200).to_csv(index=False)
+    summary = summarize_data(data, category_col=category_col, y_cols=y_cols, agg="mean")
 
     prompt = f"""
     You are a data analyst. The user uploaded data comparing products or regions.
 
-    Task: Analyze the provided sample data and deliver a comparison between the different categories in the selected column: "{category_col}".
+    Task: Analyze the provided summary and deliver a comparison between the different categories in the selected column: "{category_col}".
     Use plain English. Focus on differences in performance across the selected metrics.
     Highlight strong performers, weak ones, and anything surprising or inconsistent.
 
@@ -146,18 +1151,18 @@ def compare_products_or_regions(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Plotting
+    grouped = group_stat(data, category_col, y_cols, "mean").sort_values(by=y_cols[0], ascending=False)
+    plot_bars(data, grouped, f"Average Values by {category_col}", category_col, "Metric Values", legend=True)
+
+    st.subheader("Analysis (Powered by AI, may take a couple of seconds to load):")
+
+    render_insight(pending)
 
 def identify_sales_trends(data):
     st.subheader("Identify Sales Trends or Seasonal Patterns")
@@ -171,8 +1176,7 @@ def identify_sales_trends(data):
         x_col = st.selectbox("Select the time column (X-axis)", date_cols, index=0)
 
     # Parse date column
-    data[x_col] = pd.to_datetime(data[x_col], errors='coerce')
-    data = data.dropna(subset=[x_col])
+    data = with_parsed_dates(data, x_col)
 
     if data[x_col].isna().all():
         st.error(f"The selected column '{x_col}' could not be parsed as dates.")
@@ -186,26 +1190,12 @@ def identify_sales_trends(data):
         st.info("Please select at least one metric to continue.")
         return
 
-    # Plotting line graphs
-    fig, ax = plt.subplots()
-    for col in y_cols:
-        ax.plot(data[x_col], data[col], label=col)
-
-    ax.set_title("Sales Trends Over Time")
-    ax.set_xlabel(x_col)
-    ax.set_ylabel("Metric Value")
-    ax.legend()
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a couple seconds to load):")
-
-    sample_data = data[[x_col] + y_cols].head(200).to_csv(index=False)
+    summary = summarize_data(data, x_col=x_col, y_cols=y_cols)
 
     prompt = f"""
     You are a data analyst. The user uploaded sales data and wants to understand time-based trends.
 
-    Task: Analyze this sample of the sales data to identify any overall trends, patterns, or seasonal behaviors across the selected metrics.
+    Task: Analyze this summary of the sales data to identify any overall trends, patterns, or seasonal behaviors across the selected metrics.
     Use plain English. Mention any increases, decreases, cyclical patterns, or anomalies you observe.
 
     Conclude with a takeaway that gives the user a clear summary of what the trends suggest.
@@ -213,18 +1203,17 @@ def identify_sales_trends(data):
     If the data is too sparse or unclear, say:
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Plotting line graphs
+    plot_time_series(data, x_col, y_cols, title="Sales Trends Over Time", ylabel="Metric Value")
+
+    st.subheader("Analysis (Powered by AI, may take a couple seconds to load):")
+
+    render_insight(pending)
 
 
 # Inventory
@@ -240,8 +1229,7 @@ def monitor_stock_levels(data):
         x_col = st.selectbox("Select the time column (X-axis)", date_cols, index=0)
 
     # Parse and validate date column
-    data[x_col] = pd.to_datetime(data[x_col], errors='coerce')
-    data = data.dropna(subset=[x_col])
+    data = with_parsed_dates(data, x_col)
 
     if data[x_col].isna().all():
         st.error(f"The selected column '{x_col}' could not be parsed as dates.")
@@ -255,26 +1243,12 @@ def monitor_stock_levels(data):
         st.info("Please select at least one numeric column.")
         return
 
-    # Plot stock levels over time
-    fig, ax = plt.subplots()
-    for col in y_cols:
-        ax.plot(data[x_col], data[col], label=col)
-
-    ax.set_title("Inventory Levels Over Time")
-    ax.set_xlabel(x_col)
-    ax.set_ylabel("Stock Count")
-    ax.legend()
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a couple seconds to load):")
-
-    sample_data = data[[x_col] + y_cols].head(200).to_csv(index=False)
+    summary = summarize_data(data, x_col=x_col, y_cols=y_cols, agg="mean")
 
     prompt = f"""
     You are a data analyst. The user uploaded inventory stock level data.
 
-    Task: Analyze the following sample data to describe how inventory levels are changing over time. Look for signs of consistent depletion, restocking events, or patterns in stock behavior.
+    Task: Analyze the following summary to describe how inventory levels are changing over time. Look for signs of consistent depletion, restocking events, or patterns in stock behavior.
     Use plain English. Highlight any anomalies, rapid drops, or potential issues in inventory stability.
 
     End with a clear conclusion that helps the user understand what their stock trends suggest.
@@ -283,25 +1257,24 @@ def monitor_stock_levels(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Plot stock levels over time
+    plot_time_series(data, x_col, y_cols, title="Inventory Levels Over Time", ylabel="Stock Count", agg="mean")
+
+    st.subheader("Analysis (Powered by AI, may take a couple seconds to load):")
+
+    render_insight(pending)
 
 
 def identify_fast_slow_items(data):
     st.subheader("Identify Fast- and Slow-Moving Inventory Items")
 
     # Step 1: Category column (e.g., product/SKU)
-    cat_cols = [col for col in data.columns if data[col].dtype == 'object' and data[col].nunique() <= 100]
+    cat_cols = category_columns(data, 100)
     if not cat_cols:
         st.warning("No suitable item/category columns found.")
         return
@@ -314,30 +1287,18 @@ def identify_fast_slow_items(data):
         date_col = st.selectbox("Select a date column", data.columns)
     else:
         date_col = st.selectbox("Select the time/date column", date_cols, index=0)
-    data[date_col] = pd.to_datetime(data[date_col], errors='coerce')
-    data = data.dropna(subset=[date_col])
+    data = with_parsed_dates(data, date_col)
 
     # Step 3: Metric column (sales, stock movement, etc.)
     num_cols = data.select_dtypes(include='number').columns.tolist()
     metric_col = st.selectbox("Select the metric to measure movement (e.g., sales, quantity used)", num_cols)
 
     # Step 4: Group and aggregate by item
-    grouped = data.groupby(item_col)[metric_col].sum().sort_values(ascending=False)
+    grouped = group_stat(data, item_col, metric_col, "sum").sort_values(ascending=False)
     top_items = grouped.head(10)
     bottom_items = grouped.tail(10)
 
-    # Step 5: Plotting
-    fig, ax = plt.subplots()
-    grouped.plot(kind='bar', ax=ax)
-    ax.set_title("Total Movement by Item")
-    ax.set_ylabel("Total Quantity")
-    ax.set_xlabel("Item")
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a second to load):")
-
-    sample_data = data[[item_col, metric_col]].head(200).to_csv(index=False)
+    summary = summarize_data(data, category_col=item_col, y_cols=[metric_col])
 
     prompt = f"""
     You are a data analyst. The user uploaded inventory movement data.
@@ -351,25 +1312,24 @@ def identify_fast_slow_items(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Step 5: Plotting
+    plot_bars(data, grouped, "Total Movement by Item", "Item", "Total Quantity")
+
+    st.subheader("Analysis (Powered by AI, may take a second to load):")
+
+    render_insight(pending)
 
 
 def find_stockout_overstock_risks(data):
     st.subheader("Identify Stockout and Overstock Risks")
 
     # Step 1: Detect product/item column
-    cat_cols = [col for col in data.columns if data[col].dtype == 'object' and data[col].nunique() <= 100]
+    cat_cols = category_columns(data, 100)
     if not cat_cols:
         st.warning("No suitable item/category columns found.")
         return
@@ -382,8 +1342,7 @@ def find_stockout_overstock_risks(data):
         date_col = st.selectbox("Select a date column", data.columns)
     else:
         date_col = st.selectbox("Select the time/date column", date_cols, index=0)
-    data[date_col] = pd.to_datetime(data[date_col], errors='coerce')
-    data = data.dropna(subset=[date_col])
+    data = with_parsed_dates(data, date_col)
 
     # Step 3: Select numeric column (stock level)
     num_cols = data.select_dtypes(include='number').columns.tolist()
@@ -394,37 +1353,12 @@ def find_stockout_overstock_risks(data):
     overstock_threshold = st.number_input("Overstock threshold (≥ this value is a risk)", value=500)
 
     # Step 5: Latest stock snapshot (most recent date per item)
-    latest_stock = data.sort_values(by=date_col).groupby(item_col).tail(1)
+    latest_stock = latest_per_group(data, item_col, date_col)
 
     stockout_items = latest_stock[latest_stock[stock_col] <= stockout_threshold]
     overstock_items = latest_stock[latest_stock[stock_col] >= overstock_threshold]
 
-    # Step 6: Plotting
-    st.write("Potential Stockouts:")
-    if stockout_items.empty:
-        st.info("No items are currently below the stockout threshold.")
-    else:
-        st.dataframe(stockout_items[[item_col, stock_col]])
-        fig, ax = plt.subplots()
-        ax.bar(stockout_items[item_col], stockout_items[stock_col], color='red')
-        ax.set_title("Stockout Risk Items")
-        ax.set_ylabel("Stock Level")
-        st.pyplot(fig)
-
-    st.write("Potential Overstocks:")
-    if overstock_items.empty:
-        st.info("No items are currently above the overstock threshold.")
-    else:
-        st.dataframe(overstock_items[[item_col, stock_col]])
-        fig, ax = plt.subplots()
-        ax.bar(overstock_items[item_col], overstock_items[stock_col], color='blue')
-        ax.set_title("Overstock Risk Items")
-        ax.set_ylabel("Stock Level")
-        st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a second to load):")
-
-    sample_data = latest_stock[[item_col, stock_col]].head(200).to_csv(index=False)
+    summary = summarize_data(latest_stock, category_col=item_col, y_cols=[stock_col])
 
     prompt = f"""
     You are a data analyst. The user uploaded inventory stock data.
@@ -440,18 +1374,31 @@ def find_stockout_overstock_risks(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Step 6: Plotting
+    st.write("Potential Stockouts:")
+    if stockout_items.empty:
+        st.info("No items are currently below the stockout threshold.")
+    else:
+        st.dataframe(stockout_items[[item_col, stock_col]])
+        show_chart(latest_stock, ("stockout", item_col, stock_col, stockout_threshold),
+                   lambda: bar_chart(stockout_items.set_index(item_col)[stock_col], "Stockout Risk Items", None, "Stock Level", color='red'))
+
+    st.write("Potential Overstocks:")
+    if overstock_items.empty:
+        st.info("No items are currently above the overstock threshold.")
+    else:
+        st.dataframe(overstock_items[[item_col, stock_col]])
+        show_chart(latest_stock, ("overstock", item_col, stock_col, overstock_threshold),
+                   lambda: bar_chart(overstock_items.set_index(item_col)[stock_col], "Overstock Risk Items", None, "Stock Level", color='blue'))
+
+    st.subheader("Analysis (Powered by AI, may take a second to load):")
+
+    render_insight(pending)
 
 
 # Profits
@@ -466,8 +1413,7 @@ def analyze_profit_trends(data):
     else:
         x_col = st.selectbox("Select the time column (X-axis)", date_cols, index=0)
 
-    data[x_col] = pd.to_datetime(data[x_col], errors='coerce')
-    data = data.dropna(subset=[x_col])
+    data = with_parsed_dates(data, x_col)
     if data[x_col].isna().all():
         st.error(f"The selected column '{x_col}' could not be parsed as dates.")
         return
@@ -480,26 +1426,12 @@ def analyze_profit_trends(data):
         st.info("Please select at least one numeric column.")
         return
 
-    # Step 3: Plotting
-    fig, ax = plt.subplots()
-    for col in y_cols:
-        ax.plot(data[x_col], data[col], label=col)
-
-    ax.set_title("Profit Trends Over Time")
-    ax.set_xlabel(x_col)
-    ax.set_ylabel("Profit")
-    ax.legend()
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a second to load):")
-
-    sample_data = data[[x_col] + y_cols].head(200).to_csv(index=False)
+    summary = summarize_data(data, x_col=x_col, y_cols=y_cols)
 
     prompt = f"""
     You are a data analyst. The user uploaded profit data over time.
 
-    Task: Analyze this sample of profit data. Identify any trends, growth patterns, declines, or fluctuations.
+    Task: Analyze this summary of profit data. Identify any trends, growth patterns, declines, or fluctuations.
     Mention if certain periods had spikes or dips. Focus on what a business user would care about.
 
     Finish with a conclusion that summarizes the overall health of the profit trend.
@@ -508,25 +1440,24 @@ def analyze_profit_trends(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Step 3: Plotting
+    plot_time_series(data, x_col, y_cols, title="Profit Trends Over Time", ylabel="Profit")
+
+    st.subheader("Analysis (Powered by AI, may take a second to load):")
+
+    render_insight(pending)
 
 
 def compare_profit_margins(data):
     st.subheader("Compare Profit Margins Across Categories")
 
     # Step 1: Categorical column selection (e.g., Product, Region)
-    cat_cols = [col for col in data.columns if data[col].dtype == 'object' and data[col].nunique() <= 100]
+    cat_cols = category_columns(data, 100)
     if not cat_cols:
         st.warning("No suitable category columns found.")
         return
@@ -537,25 +1468,14 @@ def compare_profit_margins(data):
     margin_col = st.selectbox("Select the profit margin column", numeric_cols)
 
     # Step 3: Aggregate margins by category
-    grouped = data.groupby(category_col)[margin_col].mean().sort_values(ascending=False)
+    grouped = group_stat(data, category_col, margin_col, "mean").sort_values(ascending=False)
 
-    # Step 4: Plot
-    fig, ax = plt.subplots()
-    grouped.plot(kind='bar', ax=ax)
-    ax.set_title(f"Average Profit Margins by {category_col}")
-    ax.set_ylabel("Average Profit Margin")
-    ax.set_xlabel(category_col)
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a second to load):")
-
-    sample_data = data[[category_col, margin_col]].head(200).to_csv(index=False)
+    summary = summarize_data(data, category_col=category_col, y_cols=[margin_col], agg="mean")
 
     prompt = f"""
     You are a data analyst. The user uploaded data comparing profit margins across categories.
 
-    Task: Review this sample of profit margin data grouped by category: "{category_col}".
+    Task: Review this summary of profit margin data grouped by category: "{category_col}".
     Identify which categories are the most profitable, which are underperforming, and any notable patterns or inconsistencies.
 
     Use plain English. Focus on how the business could prioritize or improve different segments.
@@ -566,25 +1486,24 @@ def compare_profit_margins(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Step 4: Plot
+    plot_bars(data, grouped, f"Average Profit Margins by {category_col}", category_col, "Average Profit Margin")
+
+    st.subheader("Analysis (Powered by AI, may take a second to load):")
+
+    render_insight(pending)
 
 
 def breakdown_profit_by_category(data):
     st.subheader("Break Down Profit by Category")
 
     # Step 1: Category selection
-    cat_cols = [col for col in data.columns if data[col].dtype == 'object' and data[col].nunique() <= 100]
+    cat_cols = category_columns(data, 100)
     if not cat_cols:
         st.warning("No suitable category columns found.")
         return
@@ -595,20 +1514,9 @@ def breakdown_profit_by_category(data):
     profit_col = st.selectbox("Select the profit column", numeric_cols)
 
     # Step 3: Grouping
-    grouped = data.groupby(category_col)[profit_col].sum().sort_values(ascending=False)
-
-    # Step 4: Plotting
-    fig, ax = plt.subplots()
-    grouped.plot(kind='bar', ax=ax)
-    ax.set_title(f"Total Profit by {category_col}")
-    ax.set_ylabel("Total Profit")
-    ax.set_xlabel(category_col)
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a second to load):")
+    grouped = group_stat(data, category_col, profit_col, "sum").sort_values(ascending=False)
 
-    sample_data = data[[category_col, profit_col]].head(200).to_csv(index=False)
+    summary = summarize_data(data, category_col=category_col, y_cols=[profit_col])
 
     prompt = f"""
     You are a data analyst. The user uploaded data showing total profit by category: "{category_col}".
@@ -622,18 +1530,17 @@ def breakdown_profit_by_category(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Step 4: Plotting
+    plot_bars(data, grouped, f"Total Profit by {category_col}", category_col, "Total Profit")
+
+    st.subheader("Analysis (Powered by AI, may take a second to load):")
+
+    render_insight(pending)
 
 # Losses
 def identify_loss_patterns(data):
@@ -647,8 +1554,7 @@ def identify_loss_patterns(data):
     else:
         x_col = st.selectbox("Select the time column (X-axis)", date_cols, index=0)
 
-    data[x_col] = pd.to_datetime(data[x_col], errors='coerce')
-    data = data.dropna(subset=[x_col])
+    data = with_parsed_dates(data, x_col)
     if data[x_col].isna().all():
         st.error(f"The selected column '{x_col}' could not be parsed as dates.")
         return
@@ -661,26 +1567,12 @@ def identify_loss_patterns(data):
         st.info("Please select at least one numeric column.")
         return
 
-    # Step 3: Plotting
-    fig, ax = plt.subplots()
-    for col in y_cols:
-        ax.plot(data[x_col], data[col], label=col)
-
-    ax.set_title("Loss Trends Over Time")
-    ax.set_xlabel(x_col)
-    ax.set_ylabel("Loss Amount")
-    ax.legend()
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a second to load):")
-
-    sample_data = data[[x_col] + y_cols].head(200).to_csv(index=False)
+    summary = summarize_data(data, x_col=x_col, y_cols=y_cols)
 
     prompt = f"""
     You are a data analyst. The user uploaded time-based data on financial or operational losses.
 
-    Task: Analyze the sample data and identify patterns in losses. Look for trends over time — rising, falling, or recurring spikes.
+    Task: Analyze the summary and identify patterns in losses. Look for trends over time — rising, falling, or recurring spikes.
     Note any outliers or periods of abnormal losses.
 
     Use plain English. Conclude with a short summary explaining what the data suggests and how a business might respond.
@@ -689,25 +1581,24 @@ def identify_loss_patterns(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Step 3: Plotting
+    plot_time_series(data, x_col, y_cols, title="Loss Trends Over Time", ylabel="Loss Amount")
+
+    st.subheader("Analysis (Powered by AI, may take a second to load):")
+
+    render_insight(pending)
 
 
 def compare_loss_categories(data):
     st.subheader("Compare Loss Categories")
 
     # Step 1: Categorical column for grouping
-    cat_cols = [col for col in data.columns if data[col].dtype == 'object' and data[col].nunique() <= 100]
+    cat_cols = category_columns(data, 100)
     if not cat_cols:
         st.warning("No suitable category columns found.")
         return
@@ -718,20 +1609,9 @@ def compare_loss_categories(data):
     loss_col = st.selectbox("Select the loss amount column", numeric_cols)
 
     # Step 3: Group and aggregate
-    grouped = data.groupby(category_col)[loss_col].sum().sort_values(ascending=False)
+    grouped = group_stat(data, category_col, loss_col, "sum").sort_values(ascending=False)
 
-    # Step 4: Plot
-    fig, ax = plt.subplots()
-    grouped.plot(kind='bar', ax=ax)
-    ax.set_title(f"Total Loss by {category_col}")
-    ax.set_ylabel("Total Loss Amount")
-    ax.set_xlabel(category_col)
-    ax.grid(True)
-    st.pyplot(fig)
-
-    st.subheader("Analysis (Powered by AI, may take a second to load):")
-
-    sample_data = data[[category_col, loss_col]].head(200).to_csv(index=False)
+    summary = summarize_data(data, category_col=category_col, y_cols=[loss_col])
 
     prompt = f"""
     You are a data analyst. The user uploaded data showing losses grouped by category: "{category_col}".
@@ -745,24 +1625,23 @@ def compare_loss_categories(data):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
 
-    {sample_data}
+    {summary}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    pending = start_insight(prompt)
+
+    # Step 4: Plot
+    plot_bars(data, grouped, f"Total Loss by {category_col}", category_col, "Total Loss Amount")
+
+    st.subheader("Analysis (Powered by AI, may take a second to load):")
+
+    render_insight(pending)
 
 
 def run_general_insight(data, user_prompt=None):
     st.subheader("Analysis (Powered by AI, may take a second to load):")
 
-    sample_data = data.head(200).to_csv(index=False)
+    summary = summarize_data(data)
 
     # Base prompt
     base_prompt = f"""
@@ -776,37 +1655,43 @@ def run_general_insight(data, user_prompt=None):
     "The Data provided is not dense enough to give a full conclusion. If you could provide more data, this application will perform better."
 
     
-    {sample_data}
+    {summary}
     """
 
     # If user provided a custom prompt, append it
     if user_prompt:
         base_prompt += f"\n\nAdditional instruction from user: {user_prompt}"
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-
-            messages=[{"role": "user", "content": base_prompt}]
-        )
-        insight = response.choices[0].message.content
-        st.write(insight)
-    except Exception as e:
-        st.error(f"Error querying OpenAI: {e}")
+    render_insight(start_insight(base_prompt))
 
 
 #main function
 
+st.session_state["trace"] = Trace()
+
 st.title("Quick Insight: AI Powered Data Analysis Tool")
 
-uploaded_file = st.file_uploader("Upload your Excel file", type=["xlsx", "xls"])
+uploaded_file = st.file_uploader("Upload your data file", type=["xlsx", "xls", "csv", "parquet", "arrow", "feather"])
 
 if uploaded_file:
-    sheet_names = pd.ExcelFile(uploaded_file).sheet_names
-    selected_sheet = st.selectbox("Choose a sheet", sheet_names)
-    df = pd.read_excel(uploaded_file, sheet_name=selected_sheet)
+    digest = upload_digest(uploaded_file)
+    kind = file_kind(uploaded_file.name)
+    selected_sheet = None
+    if kind == "excel":
+        sheet_names = load_sheet_names(uploaded_file, digest)
+        selected_sheet = st.selectbox("Choose a sheet", sheet_names)
+
+    all_columns = load_column_names(uploaded_file, digest, kind, selected_sheet)
+    with st.expander("Columns to load"):
+        columns = st.multiselect("Only these columns are read from the file", all_columns, default=all_columns)
+    if not columns:
+        st.info("Please select at least one column to load.")
+        st.stop()
+    st.session_state["memory_usage"] = {}
+    st.session_state["memory_counted"] = set()
+    df = load_table(uploaded_file, digest, kind, selected_sheet, columns)
 
-    st.success(f"Loaded data from '{selected_sheet}'")
+    st.success(f"Loaded data from '{selected_sheet or uploaded_file.name}'")
 
     data_type = st.selectbox(
         "What data are you analyzing today?",
@@ -899,4 +1784,7 @@ if uploaded_file:
 
                     st.warning("Please enter a custom prompt to proceed.")
 
- 
\ No newline at end of file
+ 
+    show_memory_usage(df)
+    if TIMING_PANEL:
+        show_timings()
@@ -0,0 +1,335 @@
+#Headless benchmark for QuickInsight's analysis functions, with Streamlit and the LLM gateway replaced by stubs
+#generates synthetic sales/inventory/profit data at each size, then times every analysis cold (empty caches) and warm,
+#with per-stage wall time and peak traced memory, and writes the results as JSON for run-over-run comparison
+import argparse
+import functools
+import hashlib
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+EXCEL_MAX_DATA_ROWS = 100_000  # larger datasets are written as Parquet; Excel would take longer to write than to benchmark
+NOISE_FLOOR_S = 0.01  # --compare ignores timings below this; they are mostly scheduler noise
+FAKE_RESPONSE = "Sales rose steadily through the period with a seasonal peak at the end of each year. " * 8
+
+# Functions wrapped with a timer; times are inclusive, so a stage that calls another also counts its time
+STAGES = [
+    "load_table", "detect_date_columns", "with_parsed_dates", "category_columns", "group_stat",
+    "latest_per_group", "summarize_data", "show_chart", "start_insight", "render_insight",
+]
+
+ANALYSES = [
+    "track_sales_over_time", "compare_products_or_regions", "identify_sales_trends",
+    "monitor_stock_levels", "identify_fast_slow_items", "find_stockout_overstock_risks",
+    "analyze_profit_trends", "compare_profit_margins", "breakdown_profit_by_category",
+    "identify_loss_patterns", "compare_loss_categories", "run_general_insight",
+]
+
+
+class StopRun(Exception):
+    pass
+
+
+# Widgets answer with their defaults: the first option, the default selection or the first two metrics
+def streamlit_stub(messages):
+    st = types.ModuleType("streamlit")
+
+    class Block:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def __getattr__(self, name):
+            return getattr(st, name)
+
+    def cache_resource(func):
+        return functools.cache(func)
+
+    def stop():
+        raise StopRun()
+
+    def record(kind):
+        return lambda body="", *args, **kwargs: messages.append((kind, str(body)))
+
+    st.cache_resource = cache_resource
+    st.session_state = {}
+    st.file_uploader = lambda *args, **kwargs: None
+    st.selectbox = lambda label, options, index=0, **kwargs: list(options)[index] if len(options) else None
+    st.multiselect = lambda label, options, default=None, **kwargs: list(default) if default is not None else list(options)[:2]
+    st.number_input = lambda label, value=0, **kwargs: value
+    st.text_area = lambda *args, **kwargs: ""
+    st.button = lambda *args, **kwargs: False
+    st.write_stream = lambda stream: "".join(str(part) for part in stream)
+    st.expander = lambda *args, **kwargs: Block()
+    st.sidebar = Block()
+    st.stop = stop
+    st.error = record("error")
+    st.warning = record("warning")
+    st.__getattr__ = lambda name: (lambda *args, **kwargs: None)
+    return st
+
+
+# Streams a fixed answer in word-sized chunks after an optional delay, reporting usage like LLMGateway.stream_chat
+class StubGateway:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def stream_chat(self, messages, models=None, stats=None):
+        stats = {} if stats is None else stats
+        stats["attempts"] = 1
+        time.sleep(self.latency)
+        words = FAKE_RESPONSE.split(" ")
+        for word in words:
+            yield word + " "
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        stats["usage"] = types.SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(words),
+                                               total_tokens=prompt_tokens + len(words))
+        stats["model"] = models[0] if models else "stub"
+
+
+# With llm_server the real gateway talks to that URL (e.g. fake_openai_server.py); otherwise the stub answers
+def load_app(messages, llm_latency, cache_dir, llm_server=None):
+    os.environ["QUICKINSIGHT_CACHE_DIR"] = cache_dir
+    sys.modules["streamlit"] = streamlit_stub(messages)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    app = importlib.import_module("QuickInsight")
+    if llm_server:
+        os.environ["OPENAI_BASE_URL"] = llm_server
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    else:
+        gateway = StubGateway(llm_latency)
+        app.get_llm_gateway = lambda: gateway
+    return app
+
+
+def make_dataset(rows, data_dir, seed=0):
+    kind = "xlsx" if rows <= EXCEL_MAX_DATA_ROWS else "parquet"
+    path = os.path.join(data_dir, f"sales_{rows}.{kind}")
+    if os.path.exists(path):
+        return path
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2021-01-01", "2024-12-31").strftime("%Y-%m-%d").to_numpy()
+    products = np.array([f"Product {i:03d}" for i in range(250)])
+    units = rng.poisson(20, rows)
+    price = rng.choice(np.array([4.99, 9.99, 19.99, 49.99]), rows)
+    sales = (units * price).round(2)
+    margin = rng.normal(0.25, 0.1, rows).round(3)
+    df = pd.DataFrame({
+        "Date": dates[rng.integers(0, len(dates), rows)],  # text dates, as most exported sheets have them
+        "Region": rng.choice(np.array(["North", "South", "East", "West", "Central"]), rows),
+        "Product": products[rng.integers(0, len(products), rows)],
+        "Units Sold": units,
+        "Sales": sales,
+        "Profit": (sales * margin).round(2),
+        "Profit Margin": margin,
+        "Stock": rng.integers(0, 800, rows),
+        "Loss Reason": rng.choice(np.array(["Damage", "Theft", "Expiry", "Returns"]), rows),
+        "Loss": rng.exponential(15.0, rows).round(2),
+    })
+    os.makedirs(data_dir, exist_ok=True)
+    partial = os.path.join(data_dir, f"partial_{rows}.{kind}")
+    if kind == "xlsx":
+        df.to_excel(partial, index=False, sheet_name="Data", engine="openpyxl")
+    else:
+        df.to_parquet(partial, index=False)
+    os.replace(partial, path)
+    return path
+
+
+# Stand-in for Streamlit's UploadedFile
+class Upload:
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self.data = f.read()
+        self.size = len(self.data)
+        self.file_id = hashlib.sha256(self.data).hexdigest()
+
+    def getvalue(self):
+        return self.data
+
+
+def install_timers(app, stage_times):
+    for name in STAGES:
+        func = getattr(app, name)
+
+        def timed(*args, _name=name, _func=func, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _func(*args, **kwargs)
+            finally:
+                stage_times[_name] = stage_times.get(_name, 0.0) + time.perf_counter() - start
+
+        setattr(app, name, timed)
+
+
+def clear_caches(app, parquet=False):
+    for get_cache in (app.get_sheet_cache, app.get_stage_cache, app.get_date_column_cache):
+        cache = get_cache()
+        with cache.lock:
+            cache.entries.clear()
+            cache.total_bytes = 0
+    responses = app.get_response_cache()
+    with responses.lock, responses.conn:
+        responses.conn.execute("DELETE FROM responses")
+    if parquet and os.path.isdir(app.PARQUET_CACHE_DIR):
+        for name in os.listdir(app.PARQUET_CACHE_DIR):
+            os.remove(os.path.join(app.PARQUET_CACHE_DIR, name))
+    app.st.session_state.clear()
+
+
+def load(app, upload):
+    digest = app.upload_digest(upload)
+    kind = app.file_kind(upload.name)
+    sheet = app.load_sheet_names(upload, digest)[0] if kind == "excel" else None
+    columns = app.load_column_names(upload, digest, kind, sheet)
+    return app.load_table(upload, digest, kind, sheet, columns)
+
+
+def measure(app, stage_times, messages, run, trace_memory=False):
+    stage_times.clear()
+    del messages[:]
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = run()
+    except StopRun:
+        result = None
+    wall = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    record = {"wall_s": round(wall, 6), "stages": {name: round(t, 6) for name, t in stage_times.items()},
+              "errors": [body for kind, body in messages if kind == "error"],
+              "warnings": [body for kind, body in messages if kind == "warning"]}
+    if peak is not None:
+        record["peak_mb"] = round(peak / 1024 ** 2, 3)
+    return result, record
+
+
+def run_benchmark(app, stage_times, messages, sizes, analyses, data_dir, trace_memory):
+    results = []
+    for size in sizes:
+        path = make_dataset(SIZES[size], data_dir)
+        upload = Upload(path)
+
+        def add(function, run, record):
+            results.append({"size": size, "rows": SIZES[size], "function": function, "run": run, **record})
+            peak = f"{record['peak_mb']:9.1f} MB" if "peak_mb" in record else ""
+            print(f"{size:>4} {function:<32} {run:<5} {record['wall_s']:9.3f}s {peak}", flush=True)
+
+        load_upload = functools.partial(load, app, upload)  # bound, not closed over, so the del below is safe
+        clear_caches(app, parquet=True)
+        df, record = measure(app, stage_times, messages, load_upload)
+        add("load_table", "cold", record)
+        _, record = measure(app, stage_times, messages, load_upload)
+        add("load_table", "warm", record)
+        if trace_memory:
+            clear_caches(app, parquet=True)
+            _, record = measure(app, stage_times, messages, load_upload, trace_memory=True)
+            add("load_table", "mem", record)
+
+        for function in analyses:
+            analysis = functools.partial(getattr(app, function), df)
+            clear_caches(app)
+            _, record = measure(app, stage_times, messages, analysis)
+            add(function, "cold", record)
+            _, record = measure(app, stage_times, messages, analysis)
+            add(function, "warm", record)
+            if trace_memory:
+                clear_caches(app)
+                _, record = measure(app, stage_times, messages, analysis, trace_memory=True)
+                add(function, "mem", record)
+
+        if resource is not None:
+            # ru_maxrss is in KB on Linux and bytes on macOS
+            scale = 1 if sys.platform == "darwin" else 1024
+            print(f"{size:>4} process max RSS so far: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 ** 2:,.0f} MB")
+        del df, upload, load_upload
+    return results
+
+
+# Wall time and peak memory against an earlier run; entries that got slower or bigger than the threshold are flagged
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {(r["size"], r["function"], r["run"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (flagging > {threshold:.2f}x):")
+    for result in results:
+        old = baseline.get((result["size"], result["function"], result["run"]))
+        if old is None:
+            continue
+        metric = "peak_mb" if result["run"] == "mem" else "wall_s"
+        if metric not in result or metric not in old:
+            continue
+        ratio = result[metric] / max(old[metric], 1e-9)
+        flag = ""
+        if ratio > threshold and (metric == "peak_mb" or result[metric] > NOISE_FLOOR_S):
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"{result['size']:>4} {result['function']:<32} {result['run']:<5} "
+              f"{old[metric]:10.3f} -> {result[metric]:10.3f} {metric} ({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark QuickInsight's analysis functions headlessly.")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1m"], choices=list(SIZES))
+    parser.add_argument("--functions", nargs="+", default=ANALYSES, choices=ANALYSES)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio above which --compare reports a regression")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "quickinsight_benchmark"))
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the fake model waits before answering")
+    parser.add_argument("--llm-server", help="OpenAI-compatible URL to send requests to instead of the stub, "
+                                             "e.g. http://127.0.0.1:8765/v1 from fake_openai_server.py")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass (it slows Python-heavy code)")
+    args = parser.parse_args()
+
+    messages = []
+    stage_times = {}
+    cache_dir = tempfile.mkdtemp(prefix="quickinsight_bench_cache_")
+    app = load_app(messages, args.llm_latency, cache_dir, args.llm_server)
+    install_timers(app, stage_times)
+
+    results = run_benchmark(app, stage_times, messages, args.sizes, args.functions, args.data_dir, not args.no_memory)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "chart_backend": app.CHART_BACKEND,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to '{args.output}'")
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
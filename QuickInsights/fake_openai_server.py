@@ -0,0 +1,106 @@
+#Local stand-in for the OpenAI chat completions API, for trying QuickInsight and the LLM gateway without a key
+#answers every prompt with a short canned analysis, streamed like the real API, and can be told to be slow, flaky or
+#rate limited. Run it, then start the app with OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_gateway import TokenBucket
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    # Set from the command line in main()
+    args = None
+    limiter = None
+    calls = 0
+    calls_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        if self.args.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_error_json(self, status, message, headers=()):
+        self.send_json(status, {"error": {"message": message, "type": "fake_error", "code": status}}, headers)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.path.endswith("/chat/completions"):
+            return self.send_error_json(404, f"Unknown path {self.path}")
+        with FakeOpenAI.calls_lock:
+            FakeOpenAI.calls += 1
+            call = FakeOpenAI.calls
+        model = body["model"]
+        if model in self.args.unknown_models:
+            return self.send_error_json(404, f"The model '{model}' does not exist")
+        if self.limiter is not None:
+            wait = self.limiter.try_acquire()
+            if wait:
+                return self.send_error_json(429, "Rate limit reached", [("Retry-After", str(math.ceil(wait)))])
+        if call <= self.args.fail_first or random.random() < self.args.error_rate:
+            return self.send_error_json(self.args.error_status, "Injected failure")
+
+        time.sleep(self.args.latency)
+        prompt = "".join(message["content"] for message in body["messages"])
+        words = (f"[{model}] The data covers {len(prompt):,} characters of summary. "
+                 "Conclusion: results look consistent, with no major issues found.").split(" ")
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(words),
+                 "total_tokens": len(prompt) // 4 + len(words)}
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": " ".join(words)}
+            return self.send_json(200, {"id": f"fake-{call}", "object": "chat.completion", "created": int(time.time()),
+                                        "model": model, "usage": usage,
+                                        "choices": [{"index": 0, "message": message, "finish_reason": "stop"}]})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunk = {"id": f"fake-{call}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for i, word in enumerate(words):
+            delta = {"content": word if i == len(words) - 1 else word + " "}
+            self.write_event(dict(chunk, choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+            time.sleep(self.args.token_delay)
+        if body.get("stream_options", {}).get("include_usage"):
+            self.write_event(dict(chunk, choices=[], usage=usage))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def write_event(self, data):
+        self.wfile.write(f"data: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI chat completions API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed words")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--fail-first", type=int, default=0, help="fail this many requests before answering any")
+    parser.add_argument("--rpm", type=int, default=0, help="answer 429 beyond this many requests per minute")
+    parser.add_argument("--unknown-models", nargs="*", default=[], help="models to answer with 404")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    FakeOpenAI.args = args
+    if args.rpm:
+        FakeOpenAI.limiter = TokenBucket(args.rpm / 60, max(1, args.rpm // 6))
+    print(f"Fake OpenAI API on http://127.0.0.1:{args.port}/v1")
+    ThreadingHTTPServer(("127.0.0.1", args.port), FakeOpenAI).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#Every QuickInsight model call goes through one LLMGateway per process
+#it pools HTTP connections and caps requests per minute, tokens per minute and concurrent calls.
+#It times out stalled calls, retries transient failures with jittered backoff, and moves down a model fallback list.
+#Try it locally with fake_openai_server.py and OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+import importlib
+import random
+import threading
+import time
+
+RETRYABLE_STATUS = {408, 409, 429}  # plus every 5xx
+CHARS_PER_TOKEN = 4  # rough estimate used to charge the token bucket before the real count is known
+
+
+class LLMUnavailable(Exception):
+    pass
+
+
+# Token bucket: holds up to `capacity` tokens and refills at `rate` per second. try_acquire() takes tokens if enough
+# are available and otherwise returns how long to wait; acquire() blocks until it succeeds. charge() settles the
+# difference once the real cost is known, and may leave the bucket in debt.
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self.refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def acquire(self, amount=1):
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def charge(self, amount):
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+
+
+class LLMGateway:
+    def __init__(self, models, api_key=None, base_url=None, max_concurrency=4, requests_per_minute=500,
+                 tokens_per_minute=200_000, timeout=60.0, connect_timeout=5.0, max_retries=4, backoff_base=0.5,
+                 backoff_max=20.0):
+        # Imported here so the app can start without them. The SDK is built on httpx (httpx2 in newer releases);
+        # its pool and timeout types come from whichever one it uses.
+        import openai
+        httpx = importlib.import_module(type(openai.DEFAULT_CONNECTION_LIMITS).__module__.split(".")[0])
+        self.openai = openai
+        self.httpx = httpx
+        self.models = list(models)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute / 60, max(1, requests_per_minute // 6))
+        self.token_budget = TokenBucket(tokens_per_minute / 60, max(1, tokens_per_minute // 6))
+        # One pool of keep-alive connections shared by every call; the SDK's own retries are off because ours replace them
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            http_client=openai.DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            ),
+        )
+
+    # Streams the answer's text. Each model in the chain gets max_retries retries on transient errors before the next one
+    # is tried; a model the server does not know is skipped at once. Once text has been streamed the call is never
+    # retried, since the caller has already shown it. `models` overrides the gateway's chain for one call;
+    # `stats` receives the model that answered, the number of attempts and the token usage.
+    def stream_chat(self, messages, models=None, stats=None):
+        stats = {} if stats is None else stats
+        stats["attempts"] = 0
+        estimate = sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN
+        last_error = None
+        models = models or self.models
+        for model in models:
+            for attempt in range(self.max_retries + 1):
+                self.requests.acquire()
+                self.token_budget.acquire(estimate)
+                stats["attempts"] += 1
+                started = False
+                with self.slots:
+                    try:
+                        stream = self.client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            stream=True,
+                            stream_options={"include_usage": True}
+                        )
+                        for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                started = True
+                                yield chunk.choices[0].delta.content
+                            # With include_usage the last chunk has no choices, only the token counts
+                            if getattr(chunk, "usage", None):
+                                stats["usage"] = chunk.usage
+                                self.token_budget.charge(chunk.usage.total_tokens - estimate)
+                        stats["model"] = model
+                        return
+                    except Exception as e:
+                        if started:
+                            raise
+                        kind = self.classify(e)
+                        if kind == "fatal":
+                            raise
+                        last_error = e
+                        if kind == "skip_model":
+                            break
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff(attempt, last_error))
+        raise LLMUnavailable(f"no answer from {', '.join(models)} after {stats['attempts']} attempts: {last_error}")
+
+    # "retry" for timeouts, dropped connections, rate limits and server errors; "skip_model" for a model the server does
+    # not know; "fatal" for anything another attempt cannot fix (bad key, bad request)
+    def classify(self, error):
+        if isinstance(error, (self.openai.APIConnectionError, self.httpx.TransportError)):
+            return "retry"
+        status = getattr(error, "status_code", None)
+        if status == 404:
+            return "skip_model"
+        if status in RETRYABLE_STATUS or (status is not None and status >= 500):
+            return "retry"
+        return "fatal"
+
+    # Full jitter: a random wait up to the exponential cap, so clients that failed together do not retry together.
+    # A Retry-After from the server is a lower bound.
+    def backoff(self, attempt, error):
+        wait = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        try:
+            retry_after = float(response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = 0.0
+        return max(wait, min(retry_after, self.backoff_max))
@@ -0,0 +1,109 @@
+#Cold-start benchmark for QuickInsight: how long a fresh process takes to import the app and paint the upload screen
+#every measurement runs in a new interpreter so nothing is already imported; --baseline also measures the app as it
+#was at an earlier git revision, to show the difference
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "QuickInsight.py")
+HEAVY_MODULES = ["matplotlib", "altair", "openai"]
+
+# Executes the app as a plain module (Streamlit's bare mode): every import plus the upload screen's widgets
+IMPORT_CHILD = """
+import importlib.util, json, os, sys, time
+# Like `streamlit run`, which puts the script's folder on the path for its sibling modules
+sys.path.insert(0, os.path.dirname(sys.argv[1]))
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("QuickInsight", sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps({"import_s": time.perf_counter() - start,
+                  "loaded": [name for name in sys.argv[2:] if name in sys.modules]}))
+"""
+
+# One real script run through Streamlit's test runner: what the browser waits for before the upload screen appears
+PAINT_CHILD = """
+import sys
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+if at.exception:
+    sys.exit(at.exception[0].value)
+"""
+
+
+def child_env(cache_dir):
+    env = dict(os.environ, QUICKINSIGHT_CACHE_DIR=cache_dir)
+    # Older revisions build the OpenAI client at import and fail without a key
+    env.setdefault("OPENAI_API_KEY", "startup-benchmark")
+    return env
+
+
+def run_child(code, args, env):
+    start = time.perf_counter()
+    done = subprocess.run([sys.executable, "-c", code] + args, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if done.returncode:
+        raise RuntimeError(done.stderr.strip().splitlines()[-1] if done.stderr.strip() else f"exit {done.returncode}")
+    return wall, done.stdout
+
+
+def measure(app_path, repeat, env):
+    imports, paints, loaded = [], [], []
+    # One untimed run first so the OS file cache is warm for both variants alike
+    run_child(IMPORT_CHILD, [app_path] + HEAVY_MODULES, env)
+    for _ in range(repeat):
+        _, out = run_child(IMPORT_CHILD, [app_path] + HEAVY_MODULES, env)
+        result = json.loads(out.strip().splitlines()[-1])
+        imports.append(result["import_s"])
+        loaded = result["loaded"]
+        paints.append(run_child(PAINT_CHILD, [app_path], env)[0])
+    return {
+        "import_s": {"median": statistics.median(imports), "min": min(imports)},
+        "first_paint_s": {"median": statistics.median(paints), "min": min(paints)},
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def show(label, result):
+    print(f"{label:>10}  import {result['import_s']['median']:6.3f}s (min {result['import_s']['min']:.3f})  "
+          f"first paint {result['first_paint_s']['median']:6.3f}s (min {result['first_paint_s']['min']:.3f})  "
+          f"loaded: {', '.join(result['heavy_modules_loaded']) or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure QuickInsight's cold import time and first-paint latency.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", help="git revision to compare against, e.g. HEAD~1")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    env = child_env(tempfile.mkdtemp(prefix="quickinsight_startup_cache_"))
+    results = {"current": measure(APP, args.repeat, env)}
+    show("current", results["current"])
+
+    if args.baseline:
+        # The whole app folder at that revision, so the modules QuickInsight.py imports match it
+        repo = os.path.dirname(os.path.dirname(APP))
+        baseline_dir = tempfile.mkdtemp(prefix="quickinsight_baseline_")
+        archive = subprocess.run(["git", "archive", args.baseline, "QuickInsights"], cwd=repo, capture_output=True,
+                                 check=True).stdout
+        subprocess.run(["tar", "-x", "-C", baseline_dir], input=archive, check=True)
+        baseline_path = os.path.join(baseline_dir, "QuickInsights", "QuickInsight.py")
+        results["baseline"] = measure(baseline_path, args.repeat, env)
+        results["baseline"]["revision"] = args.baseline
+        show(args.baseline, results["baseline"])
+        for metric in ("import_s", "first_paint_s"):
+            old, new = results["baseline"][metric]["median"], results["current"][metric]["median"]
+            print(f"{metric}: {old:.3f}s -> {new:.3f}s ({old - new:+.3f}s saved, {old / new:.2f}x)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
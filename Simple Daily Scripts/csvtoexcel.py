@@ -1,13 +1,61 @@
 #Transitions a csv to excel format
+#streams the csv in chunks through a write-only workbook, so memory stays flat for multi-GB files
+import argparse
+import time
 
 import pandas as pd
+from openpyxl import Workbook
 
-# Load CSV file
-csv_file = 'input.csv'  # Replace with your CSV file path
-df = pd.read_csv(csv_file)
+EXCEL_MAX_ROWS = 1_048_576  # per sheet, header row included
+CHUNK_ROWS = 100_000
 
-# Save to Excel file
-excel_file = 'output.xlsx'  # Replace with your desired output path
-df.to_excel(excel_file, index=False)
 
-print(f"Converted '{csv_file}' to '{excel_file}'")
+def convert(csv_file, excel_file, chunksize=CHUNK_ROWS):
+    wb = Workbook(write_only=True)
+    ws = None
+    sheet_rows = 0
+    total = 0
+    header = None
+    start = time.perf_counter()
+
+    for chunk in pd.read_csv(csv_file, chunksize=chunksize):
+        if header is None:
+            # The first sheet gets its header straight away, so a csv with no data rows still keeps its columns
+            header = list(chunk.columns)
+            ws = wb.create_sheet("Sheet1")
+            ws.append(header)
+            sheet_rows = 1
+        # NaN -> None so empty csv fields stay empty cells
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+
+        for row in chunk.itertuples(index=False, name=None):
+            if sheet_rows == EXCEL_MAX_ROWS:
+                ws = wb.create_sheet(f"Sheet{len(wb.worksheets) + 1}")
+                ws.append(header)
+                sheet_rows = 1
+            ws.append(row)
+            sheet_rows += 1
+
+        total += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"{total:,} rows, {total / elapsed:,.0f} rows/sec", end="\r")
+
+    wb.save(excel_file)
+    elapsed = time.perf_counter() - start
+    print(f"\n{total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/sec), "
+          f"{len(wb.worksheets)} sheet(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a CSV file to Excel.")
+    parser.add_argument("csv", nargs="?", default="input.csv")  # Replace with your CSV file path
+    parser.add_argument("excel", nargs="?", default="output.xlsx")  # Replace with your desired output path
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    convert(args.csv, args.excel, args.chunksize)
+    print(f"Converted '{args.csv}' to '{args.excel}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,282 @@
 #uses fuzz to detect duplicate data in csvs
+#candidate pairs come from blocking + an inverted n-gram index, so only plausible pairs get scored.
+#Candidates are generated and scored one block of rows at a time, so memory stays flat however many pairs the file has
+import argparse
+import math
+import os
+from array import array
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+
+import numpy as np
 import pandas as pd
-from fuzzywuzzy import fuzz
 
-df = pd.read_csv('changethis.csv')
+try:
+    from rapidfuzz import fuzz, process  # same ratio() as fuzzywuzzy, much faster
+    cpdist = getattr(process, "cpdist", None)  # scores pairs element-wise in C; rapidfuzz 3.6+
+except ImportError:
+    from fuzzywuzzy import fuzz
+    cpdist = None
+
+NGRAM = 3
+WINDOW = 5  # sorted-neighbourhood window size
+MAX_POSTING = 128  # index keys shared by more rows than this are too common to narrow anything down; not indexed
+BLOCK_ROWS = 500  # rows whose candidates are generated and scored together
+CHUNKS_PER_WORKER = 8  # key ranges per worker while indexing; more ranges than workers keeps the pool busy
+
+
+def normalize(name):
+    return " ".join(str(name).lower().split())
+
+
+def ngrams(text, n=NGRAM):
+    padded = f"{' ' * (n - 1)}{text}{' ' * (n - 1)}"
+    return {padded[k:k + n] for k in range(len(padded) - n + 1)}
+
+
+# Max number of edits two names can differ by and still score above the threshold
+def max_edits(length, threshold):
+    longest = length * (200 - threshold) / threshold
+    return math.floor((1 - threshold / 100) * (length + longest))
+
+
+# (word, rest of the name) for each word of a multi-word key
+def word_splits(key):
+    words = key.split(" ")
+    if len(words) < 2:
+        return []
+    return [(word, " ".join(words[:k] + words[k + 1:])) for k, word in enumerate(words)]
+
+
+# "smith john" for "john smith", so names with a typo early in the first word still sort next to each other
+def rotate(key):
+    first, _, rest = key.partition(" ")
+    return f"{rest} {first}" if rest else key
+
+
+# Gram frequencies over every name and every name-minus-one-word, for one range of keys
+def count_grams(keys):
+    return Counter(gram for key in keys for text in [key] + [rest for _, rest in word_splits(key)]
+                   for gram in ngrams(text))
+
+
+# A gram's id is its rank from rarest to most common, so sorting ids puts a row's rarest grams first
+def rank_grams(frequency):
+    return {gram: r for r, gram in enumerate(sorted(frequency, key=lambda g: (frequency[g], g)))}
+
+
+# The index keys of each row in a range of keys, flattened, plus how many belong to each row
+def key_prefixes(keys, threshold, rank, word_ids):
+    prefix, lengths = array("q"), array("q")
+    for key in keys:
+        size = NGRAM * max_edits(len(key), threshold) + 1
+        ids = sorted(rank[gram] for gram in ngrams(key))[:size]
+        # Composite keys: one whole word plus a prefix gram of the rest of the name. A typo in one word leaves
+        # the other word intact, and rows sharing a word are few enough to index even when every gram is common
+        for word, rest in word_splits(key):
+            base = (word_ids[word] + 1) * len(rank)
+            ids.extend(base + gram_id for gram_id in sorted(rank[gram] for gram in ngrams(rest))[:size])
+        prefix.extend(ids)
+        lengths.append(len(ids))
+    return prefix, lengths
+
+
+def ranges(n, size):
+    return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+
+# Worker-side state (the keys while indexing, the index and names while matching), set once per process by the
+# pool's initializer instead of pickled with every task; with fork it is shared, not copied
+_worker_state = None
+
+
+def _init_worker(*state):
+    global _worker_state
+    _worker_state = state
+
+
+def _count_range(key_range):
+    keys, = _worker_state
+    return count_grams(keys[key_range[0]:key_range[1]])
+
+
+def _prefix_range(task):
+    (start, stop), threshold, rank, word_ids = task
+    keys, = _worker_state
+    return key_prefixes(keys[start:stop], threshold, rank, word_ids)
+
+
+# Inverted n-gram index with prefix filtering plus sorted-neighbourhood blocking, stored as flat numpy arrays.
+# Each row is indexed by its rarest grams, enough of them that two rows within the edit budget share at least one;
+# keys too common to be useful are dropped, and the word+gram keys and neighbourhood windows catch what they would have.
+# With workers > 1 the two per-key passes run over key ranges in a process pool, concatenated in range order.
+class CandidateIndex:
+    def __init__(self, keys, threshold, window=WINDOW, workers=1):
+        self.n = len(keys)
+        self.window = window
+        word_ids = {word: k for k, word in enumerate(sorted({word for key in keys for word in key.split(" ")}))}
+        if workers > 1:
+            key_ranges = ranges(self.n, max(1, math.ceil(self.n / (workers * CHUNKS_PER_WORKER))))
+            with Pool(workers, initializer=_init_worker, initargs=(keys,)) as pool:
+                frequency = sum(pool.imap(_count_range, key_ranges), Counter())
+                rank = rank_grams(frequency)
+                parts = list(pool.imap(_prefix_range, [(r, threshold, rank, word_ids) for r in key_ranges]))
+        else:
+            rank = rank_grams(count_grams(keys))
+            parts = [key_prefixes(keys, threshold, rank, word_ids)]
+        prefix = np.concatenate([np.frombuffer(part, dtype=np.int64) for part, _ in parts])
+        lengths = np.concatenate([np.frombuffer(part, dtype=np.int64) for _, part in parts])
+
+        # Renumber the keys densely; plain grams keep their rarity order since their ids come first
+        _, self.prefix = np.unique(prefix, return_inverse=True)
+        self.owner = np.repeat(np.arange(self.n), lengths)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+        # Postings as one array sorted by key, each key's rows in ascending order
+        self.counts = np.bincount(self.prefix)
+        self.usable = (self.counts > 1) & (self.counts <= MAX_POSTING)
+        self.postings = self.owner[np.argsort(self.prefix, kind="stable")]
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)))
+
+        self.orders, self.positions = [], []
+        for sort_keys in (keys, [rotate(key) for key in keys]):
+            order = np.array(sorted(range(self.n), key=sort_keys.__getitem__), dtype=np.int64)
+            position = np.empty(self.n, dtype=np.int64)
+            position[order] = np.arange(self.n)
+            self.orders.append(order)
+            self.positions.append(position)
+
+    # Every candidate (i, j) with j < i and start <= i < stop, once each, sorted by i then j
+    def block_pairs(self, start, stop):
+        lo, hi = self.offsets[start], self.offsets[stop]
+        grams, owners = self.prefix[lo:hi], self.owner[lo:hi]
+        keep = self.usable[grams]
+        grams, owners = grams[keep], owners[keep]
+        sizes = self.counts[grams]
+        # Expand each (row, gram) into the gram's whole posting list
+        skip = np.repeat(self.starts[grams] - (np.cumsum(sizes) - sizes), sizes)
+        i = [np.repeat(owners, sizes)]
+        j = [self.postings[skip + np.arange(sizes.sum())]]
+
+        block = np.arange(start, stop)
+        for order, position in zip(self.orders, self.positions):
+            for step in range(1, self.window):
+                for shift in (-step, step):
+                    near = position[block] + shift
+                    inside = (near >= 0) & (near < self.n)
+                    i.append(block[inside])
+                    j.append(order[near[inside]])
+
+        i, j = np.concatenate(i), np.concatenate(j)
+        earlier = j < i
+        pairs = np.unique(i[earlier] * self.n + j[earlier])
+        return pairs // self.n, pairs % self.n
+
+
+# Score one block of candidate pairs; length filter first so hopeless pairs never reach fuzz
+def score_pairs(names, lengths, i, j, threshold):
+    la, lb = lengths[i], lengths[j]
+    total = la + lb
+    keep = (total == 0) | (200 * np.minimum(la, lb) > threshold * total)
+    i, j = i[keep], j[keep]
+    if cpdist is not None:
+        scores = cpdist(names[i], names[j], scorer=fuzz.ratio, score_cutoff=threshold)
+    else:
+        scores = np.array([fuzz.ratio(names[a], names[b]) for a, b in zip(i, j)], dtype=float)
+    match = scores > threshold
+    return list(zip(j[match].tolist(), i[match].tolist()))
+
+
+# One block's work: generate its candidates and score them. Returns (dupes, candidates)
+def match_block(index, names, lengths, threshold, start, stop):
+    i, j = index.block_pairs(start, stop)
+    return score_pairs(names, lengths, i, j, threshold), len(i)
+
+
+def _match_range(block):
+    index, names, lengths, threshold = _worker_state
+    return match_block(index, names, lengths, threshold, *block)
+
+
+# Splits the rows into blocks; each block's candidates are generated and scored together, by a pool worker when
+# workers > 1, so only a block's pairs are ever in memory at once. Workers read the index inherited from the parent,
+# and imap hands results back in block order, so the dupes list is identical to the single-core result.
+# Returns (dupes, candidates)
+def find_dupes(names, keys, threshold, workers):
+    index = CandidateIndex(keys, threshold, workers=workers)
+    lengths = np.array([len(name) for name in names], dtype=np.int64)
+    dupes, candidates = [], 0
+    if workers <= 1:
+        results = (match_block(index, names, lengths, threshold, *block) for block in ranges(len(keys), BLOCK_ROWS))
+        for block_dupes, block_candidates in results:
+            dupes.extend(block_dupes)
+            candidates += block_candidates
+        return dupes, candidates
+
+    with Pool(workers, initializer=_init_worker, initargs=(index, names, lengths, threshold)) as pool:
+        for block_dupes, block_candidates in pool.imap(_match_range, ranges(len(keys), BLOCK_ROWS)):
+            dupes.extend(block_dupes)
+            candidates += block_candidates
+    return dupes, candidates
+
+
+# Union-find over the matched pairs, so a~b and b~c end up in one group
+def cluster(dupes):
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in dupes:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = defaultdict(list)
+    for x in parent:
+        groups[find(x)].append(x)
+    return sorted(sorted(members) for members in groups.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find fuzzy duplicate rows in a CSV.")
+    parser.add_argument("csv", nargs="?", default="changethis.csv")
+    parser.add_argument("--column", default="name")  #change depending on use case
+    parser.add_argument("--threshold", type=float, default=90)
+    parser.add_argument("--output", default="duplicate_groups.csv")
+    parser.add_argument("--workers", type=int, default=1, help="processes for indexing and matching (0 = all cores)")
+    parser.add_argument("--quiet", action="store_true", help="print only the totals, not every duplicate pair")
+    args = parser.parse_args()
+
+    column = pd.read_csv(args.csv, usecols=[args.column])[args.column]
+    # Blank names are not duplicates of anything, so those rows are left out of matching and of every group
+    present = np.flatnonzero(column.notna() & column.astype(str).str.strip().ne("").to_numpy())
+    # Rows with exactly the same name are duplicates without scoring; only one of each name goes through matching
+    codes, unique_names = pd.factorize(column.iloc[present].astype(str))
+    first_row = np.empty(len(unique_names), dtype=np.int64)
+    first_row[codes[::-1]] = present[::-1]  # the last write for each code is its first row
+    repeat = first_row[codes] != present
+    dupes = list(zip(first_row[codes[repeat]].tolist(), present[repeat].tolist()))
+
+    names = np.asarray(unique_names, dtype=object)
+    keys = [normalize(name) for name in names]
+    workers = args.workers or os.cpu_count()
+    matches, candidates = find_dupes(names, keys, args.threshold, workers)
+    dupes.extend((first_row[a], first_row[b]) for a, b in matches)
+    dupes = sorted((int(a), int(b)) for a, b in dupes)
+    groups = cluster(dupes)
+
+    if not args.quiet:
+        print("Possible duplicates:", dupes)
+    print(f"{len(groups)} duplicate groups from {candidates} candidate pairs over {len(column)} rows")
 
-dupes = []
+    rows = [(group_id, row, column.iat[row]) for group_id, members in enumerate(groups) for row in members]
+    pd.DataFrame(rows, columns=["group", "row", args.column]).to_csv(args.output, index=False)
 
-for i in range(len(df)):
-    for j in range(i + 1, len(df)):
-        #change depending on use case
-        if fuzz.ratio(df.loc[i, 'name'], df.loc[j, 'name']) > 90:
-            dupes.append((i, j))
 
-print("Possible duplicates:", dupes)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#Checks that dupedetect.py finishes a large name file in bounded memory and finds the duplicates planted in it
+#writes N "first last" names drawn with a skewed (Zipf-like) frequency, as real customer lists are, then copies a
+#share of them with a typo. Runs dupedetect.py on the file and fails if peak memory or the missed plants exceed the limits.
+#Blank and whitespace-only names are scattered through the file; they must stay out of every group.
+#A small file is also checked against brute force: its groups must match scoring every pair.
+#With --workers N it also runs single-core, checks both wrote the same groups and reports the speedup
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SYLLABLES = ["an", "ar", "be", "da", "el", "en", "ha", "is", "jo", "ka", "la", "li", "ma", "mi", "na", "ne", "ol",
+             "ra", "ri", "sa", "se", "ta", "th", "to", "va", "wi", "ch", "st", "mo", "ky"]
+
+
+def make_names(count, syllables, rng):
+    names = set()
+    while len(names) < count:
+        parts = rng.choice(SYLLABLES, rng.integers(syllables[0], syllables[1] + 1))
+        names.add("".join(parts).capitalize())
+    return np.array(sorted(names))
+
+
+def typo(name, rng):
+    k = int(rng.integers(1, len(name)))
+    edit = rng.integers(3)
+    if edit == 0:
+        return name[:k] + name[k + 1:]
+    if edit == 1:
+        return name[:k] + "xyz"[int(rng.integers(3))] + name[k:]
+    return name[:k - 1] + name[k] + name[k - 1] + name[k + 1:]
+
+
+def make_file(path, rows, plant_share, blank_share=0.001, seed=0):
+    rng = np.random.default_rng(seed)
+    firsts = make_names(2_000, (2, 3), rng)
+    lasts = make_names(20_000, (2, 4), rng)
+    # Zipf-like weights: a few very common names and a long tail, as in real customer lists
+    first_weights = 1 / np.arange(1, len(firsts) + 1) ** 1.1
+    last_weights = 1 / np.arange(1, len(lasts) + 1) ** 0.9
+    planted = int(rows * plant_share)
+    names = (rng.choice(firsts, rows - planted, p=first_weights / first_weights.sum()).astype(object) + " "
+             + rng.choice(lasts, rows - planted, p=last_weights / last_weights.sum()).astype(object))
+    sources = rng.integers(0, len(names), planted)
+    copies = np.array([typo(names[i], rng) for i in sources], dtype=object)
+    values = np.concatenate([names, copies])
+    # Empty cells (read back as missing) and whitespace-only names at random positions; rows after each move down one
+    slots = np.sort(rng.integers(0, len(values) + 1, max(1, int(rows * blank_share))))
+    blanks = np.where(np.arange(len(slots)) % 2, "  ", "").astype(object)
+    names = np.insert(values, slots, blanks)
+    # An id column as well, so an empty name is an empty cell rather than a blank line pandas would skip
+    pd.DataFrame({"id": np.arange(len(names)), "name": names}).to_csv(path, index=False)
+    moved = np.arange(len(values)) + np.searchsorted(slots, np.arange(len(values)), side="right")
+    blank_rows = slots + np.arange(len(slots))
+    return [(int(moved[i]), int(moved[rows - planted + k])) for k, i in enumerate(sources)], set(blank_rows.tolist())
+
+
+# Groups from scoring every pair of non-blank names, as sets of rows
+def brute_force_groups(csv_path, threshold):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from dupedetect import cluster, fuzz
+    names = pd.read_csv(csv_path)["name"]
+    rows = [row for row, name in enumerate(names) if isinstance(name, str) and name.strip()]
+    dupes = [(a, b) for k, a in enumerate(rows) for b in rows[k + 1:] if fuzz.ratio(names[a], names[b]) > threshold]
+    return {frozenset(group) for group in cluster(dupes)}
+
+
+def written_groups(output):
+    groups = pd.read_csv(output)
+    return {frozenset(rows) for rows in groups.groupby("group")["row"].apply(list)}
+
+
+def run_dupedetect(csv_path, output, threshold, workers):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dupedetect.py")
+    start = time.perf_counter()
+    done = subprocess.run([sys.executable, script, csv_path, "--threshold", str(threshold), "--output", output,
+                           "--workers", str(workers), "--quiet"], capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    print(f"workers={workers}: {done.stdout.strip()} ({elapsed:.1f}s)")
+    if done.returncode:
+        sys.exit(f"dupedetect.py failed with exit code {done.returncode}: {done.stderr.strip()[-500:]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run dupedetect.py on a large synthetic name file and check its limits.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--plant-share", type=float, default=0.02, help="share of rows that are typo copies")
+    parser.add_argument("--max-rss-mb", type=float, default=1024)
+    parser.add_argument("--min-recall", type=float, default=0.8, help="share of planted copies that must be grouped")
+    parser.add_argument("--threshold", type=float, default=85)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="dupedetect_check_")
+    csv_path = os.path.join(work_dir, "names.csv")
+    output = os.path.join(work_dir, "groups.csv")
+    plants, blank_rows = make_file(csv_path, args.rows, args.plant_share)
+    print(f"{args.rows:,} rows, {os.path.getsize(csv_path) / 1024 ** 2:.1f} MB, {len(plants):,} planted typo copies, "
+          f"{len(blank_rows):,} blank names")
+
+    elapsed = run_dupedetect(csv_path, output, args.threshold, args.workers)
+
+    # ru_maxrss is the largest single child: the main process or its biggest worker (KB on Linux)
+    peak_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024 if resource else float("nan")
+    groups = pd.read_csv(output)
+    group_of = dict(zip(groups["row"], groups["group"]))
+    found = sum(1 for a, b in plants if a in group_of and group_of.get(a) == group_of.get(b))
+    recall = found / max(len(plants), 1)
+    print(f"peak RSS {peak_mb:,.0f} MB, {found:,} of {len(plants):,} planted copies grouped ({recall:.1%})")
+
+    failures = []
+    grouped_blanks = blank_rows & set(groups["row"])
+    if grouped_blanks:
+        failures.append(f"{len(grouped_blanks):,} blank names were put in groups")
+
+    small_csv = os.path.join(work_dir, "small.csv")
+    small_output = os.path.join(work_dir, "small_groups.csv")
+    make_file(small_csv, 400, 0.05, blank_share=0.01, seed=1)
+    run_dupedetect(small_csv, small_output, args.threshold, 1)
+    if written_groups(small_output) != brute_force_groups(small_csv, args.threshold):
+        failures.append("groups on the 400-row file differ from scoring every pair")
+
+    if args.workers > 1:
+        single_output = os.path.join(work_dir, "groups_single.csv")
+        single = run_dupedetect(csv_path, single_output, args.threshold, 1)
+        print(f"{args.workers} workers: {single / elapsed:.2f}x the single-core speed")
+        with open(output) as f, open(single_output) as g:
+            if f.read() != g.read():
+                failures.append(f"{args.workers} workers wrote different groups than one")
+    if peak_mb > args.max_rss_mb:
+        failures.append(f"peak RSS {peak_mb:,.0f} MB is over {args.max_rss_mb:,.0f} MB")
+    if recall < args.min_recall:
+        failures.append(f"recall {recall:.1%} is under {args.min_recall:.0%}")
+    if failures:
+        sys.exit("FAILED: " + "; ".join(failures))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
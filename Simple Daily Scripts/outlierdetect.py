@@ -1,12 +1,124 @@
-#Detects outliers in a file, change parameters before use. 
+#Detects outliers in a file, change parameters before use.
+#pass 1 streams the file into one KLL quantile sketch per column, pass 2 streams out the rows inside the IQR fences
 
+import argparse
+import math
+
+import numpy as np
 import pandas as pd
 
-df = pd.read_csv('data.csv')
+CHUNK_ROWS = 500_000
+
+
+# KLL sketch: a stack of compactors, items at level h stand for 2**h original values.
+# Sketches of different chunks/files can be merged and still give the same error guarantee.
+class KLLSketch:
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        self.n += other.n
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self.capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[h])
+                # An odd item out stays behind; every other sorted item is promoted with double weight
+                self.levels[h] = items[len(items) - len(items) % 2:]
+                promoted = items[self.rng.integers(2):len(items) - len(items) % 2:2]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def quantile(self, q):
+        if self.n == 0:
+            return np.nan
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        pos = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return items[order][min(pos, len(items) - 1)]
+
+    # Normalized rank error at ~99% confidence (the empirical KLL bound used by Apache DataSketches)
+    def rank_error(self):
+        return 2.296 / self.k ** 0.9723
+
+
+def iqr_fences(q1, q3):
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drop IQR outliers from a CSV without loading it into memory.")
+    parser.add_argument("csv", nargs="?", default="data.csv")
+    parser.add_argument("--columns", nargs="+", default=["value"])
+    parser.add_argument("--output", default="no_outliers.csv")
+    parser.add_argument("-k", type=int, default=200, help="sketch size; rank error shrinks roughly as 1/k")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--exact", action="store_true", help="also compute exact quartiles to compare (loads the value columns)")
+    args = parser.parse_args()
+
+    # Pass 1: sketch every value column in one read
+    sketches = {col: KLLSketch(args.k) for col in args.columns}
+    for chunk in pd.read_csv(args.csv, usecols=args.columns, chunksize=args.chunksize):
+        for col in args.columns:
+            sketches[col].update(chunk[col].to_numpy(dtype=float))
+
+    fences = {}
+    for col, sketch in sketches.items():
+        eps = sketch.rank_error()
+        q1, q3 = sketch.quantile(0.25), sketch.quantile(0.75)
+        fences[col] = iqr_fences(q1, q3)
+        print(f"{col}: n={sketch.n:,} q1={q1:.6g} q3={q3:.6g} fences=({fences[col][0]:.6g}, {fences[col][1]:.6g})")
+        print(f"    rank error <= {eps:.2%}: q1 in [{sketch.quantile(0.25 - eps):.6g}, {sketch.quantile(0.25 + eps):.6g}], "
+              f"q3 in [{sketch.quantile(0.75 - eps):.6g}, {sketch.quantile(0.75 + eps):.6g}]")
+
+    if args.exact:
+        values = pd.read_csv(args.csv, usecols=args.columns)
+        for col in args.columns:
+            exact_q1, exact_q3 = values[col].quantile(0.25), values[col].quantile(0.75)
+            approx_q1, approx_q3 = sketches[col].quantile(0.25), sketches[col].quantile(0.75)
+            print(f"{col}: exact q1={exact_q1:.6g} (error {abs(approx_q1 - exact_q1):.3g}), "
+                  f"exact q3={exact_q3:.6g} (error {abs(approx_q3 - exact_q3):.3g})")
+        del values
+
+    # Pass 2: stream out rows that sit inside the fences for every column
+    first = True
+    kept = total = 0
+    for chunk in pd.read_csv(args.csv, chunksize=args.chunksize):
+        mask = np.ones(len(chunk), dtype=bool)
+        for col, (low, high) in fences.items():
+            mask &= ((chunk[col] >= low) & (chunk[col] <= high)).to_numpy()
+        chunk[mask].to_csv(args.output, mode="w" if first else "a", header=first, index=False)
+        first = False
+        kept += int(mask.sum())
+        total += len(chunk)
+
+    print(f"Kept {kept:,} of {total:,} rows in '{args.output}'")
 
-q1 = df['value'].quantile(0.25) 
-q3 = df['value'].quantile(0.75) 
 
-iqr = q3 - q1
-filtered = df[(df['value'] >= q1 - 1.5 * iqr) & (df['value'] <= q3 + 1.5 * iqr)]
-filtered.to_csv('no_outliers.csv', index=False)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,132 @@
 #Merge two pandas data frames, change values before use
+#inputs bigger than the memory budget are hash-partitioned to disk and joined one partition at a time.
+#Out of core, a key that looks numeric in both files is compared as a number, like the in-memory join does
+#("411", "411.0" and "0411" match); otherwise keys are compared as text and must be written the same way in both files
+import argparse
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
 import pandas as pd
 
-df1 = pd.read_csv('changethis1.csv')
-df2 = pd.read_csv('changethis2.csv')
+MEMORY_FACTOR = 3  # rough size of a parsed DataFrame relative to its csv on disk
+SAMPLE_ROWS = 1000  # rows read to estimate how much memory each row of a csv takes once parsed
+
+
+# Bytes one row of a csv takes once read as text, estimated from its first rows
+def row_bytes(csv_file):
+    sample = pd.read_csv(csv_file, dtype=str, keep_default_na=False, nrows=SAMPLE_ROWS)
+    return max(1.0, sample.memory_usage(deep=True, index=False).sum() / max(len(sample), 1))
+
+
+# Whether every non-blank key among a csv's first rows parses as a number
+def numeric_key(csv_file, key):
+    sample = pd.read_csv(csv_file, dtype=str, keep_default_na=False, usecols=[key], nrows=SAMPLE_ROWS)[key]
+    sample = sample[sample.str.strip() != ""]
+    return len(sample) > 0 and bool(pd.to_numeric(sample, errors="coerce").notna().all())
+
+
+# Numeric keys rewritten in one canonical form, so equal numbers hash and merge as equal text: whole numbers without
+# a decimal point or leading zeros, other numbers as Python prints them. Blanks and text that does not parse stay as is
+def normalize_key(values, numeric):
+    if not numeric:
+        return values
+    parsed = pd.to_numeric(values, errors="coerce")
+    if parsed.dtype.kind in "iu":
+        return parsed.astype(str)
+    whole = parsed.notna() & (parsed % 1 == 0) & (parsed.abs() < 2 ** 53)
+    fractional = parsed.notna() & ~whole
+    text = values.copy()
+    text[whole] = parsed[whole].astype(np.int64).astype(str)
+    text[fractional] = parsed[fractional].map(repr)
+    return text
+
+
+# Spill a csv into n_parts files by hash of the key, so matching keys always land in the same partition.
+# Everything is read as text: hashes agree across both inputs and values are written back unchanged.
+def partition(csv_file, key, n_parts, out_dir, prefix, chunk_rows, numeric):
+    columns = pd.read_csv(csv_file, nrows=0).columns
+    paths = [os.path.join(out_dir, f"{prefix}_{p}.csv") for p in range(n_parts)]
+    for path in paths:
+        pd.DataFrame(columns=columns).to_csv(path, index=False)
+
+    for chunk in pd.read_csv(csv_file, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+        chunk[key] = normalize_key(chunk[key], numeric)
+        parts = pd.util.hash_pandas_object(chunk[key], index=False) % n_parts
+        for p, group in chunk.groupby(parts.to_numpy()):
+            group.to_csv(paths[p], mode="a", header=False, index=False)
+    return paths
+
+
+def read_part(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def out_of_core_merge(left_csv, right_csv, key, how, output, budget_bytes):
+    total = os.path.getsize(left_csv) + os.path.getsize(right_csv)
+    n_parts = max(1, math.ceil(total * MEMORY_FACTOR / budget_bytes))
+    spill_dir = tempfile.mkdtemp(prefix="pandasmerge_")
+    try:
+        if how == "cross":
+            # No key to partition on: pair up chunks of each side instead. A pair of chunks makes left rows x right
+            # rows output rows, so both sides get sqrt of the rows that fit in half the budget; the other half is
+            # for the two chunks themselves and to_csv's buffers
+            merged_rows = budget_bytes / 2 / (row_bytes(left_csv) + row_bytes(right_csv))
+            side_rows = max(1, math.isqrt(int(merged_rows)))
+            first = True
+            for left in pd.read_csv(left_csv, dtype=str, keep_default_na=False, chunksize=side_rows):
+                for right in pd.read_csv(right_csv, dtype=str, keep_default_na=False, chunksize=side_rows):
+                    # Written without keeping a reference, so one merged chunk is never alive next to the one before
+                    pd.merge(left, right, how="cross").to_csv(output, mode="w" if first else "a", header=first,
+                                                              index=False)
+                    first = False
+            return 0
+
+        left_numeric, right_numeric = numeric_key(left_csv, key), numeric_key(right_csv, key)
+        if left_numeric != right_numeric:
+            print(f"Warning: '{key}' looks numeric in {left_csv if left_numeric else right_csv} but not in "
+                  f"{right_csv if left_numeric else left_csv}; keys are matched as text, so 411 and 411.0 differ")
+        numeric = left_numeric and right_numeric
+        # A chunk being partitioned is held twice, once whole and once split into groups
+        left_parts = partition(left_csv, key, n_parts, spill_dir, "left",
+                               max(1, int(budget_bytes / 2 / row_bytes(left_csv))), numeric)
+        right_parts = partition(right_csv, key, n_parts, spill_dir, "right",
+                                max(1, int(budget_bytes / 2 / row_bytes(right_csv))), numeric)
+        for p in range(n_parts):
+            # A single very frequent key can still make one partition larger than the budget
+            pd.merge(read_part(left_parts[p]), read_part(right_parts[p]), on=key, how=how).to_csv(
+                output, mode="w" if p == 0 else "a", header=p == 0, index=False)
+        return n_parts
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Join two CSV files on a key column.")
+    parser.add_argument("left", nargs="?", default="changethis1.csv")
+    parser.add_argument("right", nargs="?", default="changethis2.csv")
+    parser.add_argument("--on", default="changethisalso")
+    parser.add_argument("--how", default="inner", choices=["inner", "left", "right", "outer", "cross"])
+    parser.add_argument("--output", default="merged_sheet.csv")
+    parser.add_argument("--memory-budget", type=float, default=1024, help="MB; larger inputs are joined out of core")
+    parser.add_argument("--out-of-core", action="store_true", help="always use the partitioned join")
+    args = parser.parse_args()
+
+    budget = args.memory_budget * 1024 ** 2
+    size = os.path.getsize(args.left) + os.path.getsize(args.right)
+    if not args.out_of_core and size * MEMORY_FACTOR <= budget:
+        df1 = pd.read_csv(args.left)
+        df2 = pd.read_csv(args.right)
+        on = None if args.how == "cross" else args.on
+        merged = pd.merge(df1, df2, on=on, how=args.how)
+        merged.to_csv(args.output, index=False)
+    else:
+        # Output rows come out grouped by partition rather than in pandas' order
+        n_parts = out_of_core_merge(args.left, args.right, args.on, args.how, args.output, budget)
+        print(f"Joined out of core using {n_parts} partitions" if n_parts else "Joined out of core in chunks")
+
 
-merged = pd.merge(df1, df2, on='changethisalso', how='inner')
-merged.to_csv('merged_sheet.csv', index=False)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
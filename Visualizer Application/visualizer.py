@@ -3,69 +3,452 @@
 # THANKS
 
 
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import dearpygui.dearpygui as dpg
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Workbook sheets are converted to Parquet once and read from here on later runs
+CACHE_DIR = os.getenv("VISUALIZER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".visualizer_cache"))
+CACHE_MAX_MB = int(os.getenv("VISUALIZER_CACHE_MB", "4096"))  # least recently used files are removed past this
+MAX_RESIDENT_SHEETS = int(os.getenv("VISUALIZER_MAX_SHEETS", "4"))  # sheets kept in memory, least recently used dropped first
+PREFETCH_SHEETS = 2  # sheets after the selected one converted in the background
+STATS_BLOCK_ROWS = 65536
+PLOT_BUCKETS = 2000  # min/max buckets per series for the visible x range, so at most 2x this many points are drawn
+
+# One background worker converts likely-next sheets while the user looks at the current one
+prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheet-prefetch")
+
+# Heavy work (parsing, cleaning, statistics) runs one task at a time on this worker.
+# The data fields of app_data are only changed by tasks; widgets are only touched on the GUI thread,
+# which picks finished results up from task_results once per frame.
+task_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="visualizer-task")
+task_results = queue.Queue()
+pending_tasks = []
 
 # Global data
 app_data = {
     "excel_file": None,
     "sheets": [],
-    "dataframes": {},
-    "current_df": None
+    "sources": {},
+    "prefetch": {},
+    "columns": {},
+    "dataframes": OrderedDict(),
+    "cleaned": {},
+    "current_sheet": None,
+    "plot": None
 }
 
-# Load Excel and populate sheets
+
+def file_kind(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return "excel" if ext in ("xlsx", "xls") else "arrow" if ext == "feather" else ext
+
+
+# Cache entries are keyed on path, size and mtime, so an edited workbook is converted again
+def cache_path(file_path, suffix):
+    stat = os.stat(file_path)
+    key = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}|{suffix}"
+    return os.path.join(CACHE_DIR, hashlib.sha256(key.encode()).hexdigest())
+
+
+def excel_sheet_names(file_path):
+    path = cache_path(file_path, "sheets") + ".json"
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    sheet_names = pd.ExcelFile(file_path, engine='openpyxl').sheet_names
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(sheet_names, f)
+    return sheet_names
+
+
+def convert_sheet_to_parquet(file_path, sheet):
+    path = cache_path(file_path, sheet) + ".parquet"
+    if not os.path.exists(path):
+        df = pd.read_excel(file_path, sheet_name=sheet, engine='openpyxl')
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        try:
+            df.to_parquet(path + ".tmp", index=False)
+        except (ValueError, TypeError):
+            # Columns mixing text and numbers cannot be stored as-is; keep them as text
+            text_cols = df.select_dtypes(include="object").columns
+            df.astype({col: "string" for col in text_cols}).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        prune_cache(keep=path)
+    else:
+        os.utime(path)  # mtime is last use, so the prune keeps sheets that are still opened
+    return path
+
+
+# Newest files are kept until CACHE_MAX_MB is reached; older ones are removed, except the open file's sheets,
+# which are read a few columns at a time for as long as it stays open. Prefetch and tasks can prune at once,
+# so a file the other thread already removed is skipped
+def prune_cache(keep):
+    in_use = {keep} | {path for kind, path in list(app_data["sources"].values()) if kind == "parquet"}
+    files = [os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith((".parquet", ".json"))]
+    dated = []
+    for path in files:
+        try:
+            dated.append((os.path.getmtime(path), os.path.getsize(path), path))
+        except FileNotFoundError:
+            pass
+    total = 0
+    for _, size, path in sorted(dated, reverse=True):
+        total += size
+        if total > CACHE_MAX_MB * 1024 ** 2 and path not in in_use:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# Column names come from the file's schema or header, without reading any data
+def schema_columns(kind, path):
+    if kind == "csv":
+        columns = pd.read_csv(path, nrows=0).columns.tolist()
+    elif kind == "parquet":
+        columns = pq.read_schema(path).names
+    else:
+        with pa.memory_map(path) as source:
+            columns = pa.ipc.open_file(source).schema.names
+    return [col for col in columns if not col.startswith("__index_level_")]
+
+
+# Where to read a sheet from; workbook sheets are converted on first use unless a prefetch already did it
+def sheet_source(sheet):
+    source = app_data["sources"].get(sheet)
+    if source is None:
+        future = app_data["prefetch"].pop(sheet, None)
+        if future is not None and not future.cancel():
+            path = future.result()
+        else:
+            path = convert_sheet_to_parquet(app_data["excel_file"], sheet)
+        source = app_data["sources"][sheet] = ("parquet", path)
+    return source
+
+
+def prefetch_sheets(after=None):
+    sheets = app_data["sheets"]
+    start = sheets.index(after) + 1 if after in sheets else 0
+    for sheet in sheets[start:start + PREFETCH_SHEETS]:
+        if sheet not in app_data["sources"] and sheet not in app_data["prefetch"]:
+            app_data["prefetch"][sheet] = prefetch_executor.submit(convert_sheet_to_parquet, app_data["excel_file"], sheet)
+
+
+def cancel_prefetch():
+    for future in app_data["prefetch"].values():
+        future.cancel()
+    app_data["prefetch"] = {}
+
+
+# Read only the requested columns of a sheet, adding them to what was loaded before
+def read_columns(sheet, cols):
+    kind, path = sheet_source(sheet)
+    df = app_data["dataframes"].get(sheet, pd.DataFrame())
+    missing = [col for col in dict.fromkeys(cols) if col not in df.columns]
+    if missing:
+        if kind == "csv":
+            new = pd.read_csv(path, usecols=missing)
+        elif kind == "parquet":
+            new = pd.read_parquet(path, columns=missing)
+        else:
+            new = pd.read_feather(path, columns=missing)
+        df = new if df.empty else pd.concat([df, new], axis=1)
+        app_data["dataframes"][sheet] = df
+    app_data["dataframes"].move_to_end(sheet)
+    while len(app_data["dataframes"]) > MAX_RESIDENT_SHEETS:
+        evicted, _ = app_data["dataframes"].popitem(last=False)
+        app_data["cleaned"] = {key: values for key, values in app_data["cleaned"].items() if key[0] != evicted}
+    return df[list(dict.fromkeys(cols))]
+
+
+# Turn a column into float64 values. Numeric columns are used as they are and dates become seconds since
+# the epoch. Text is stripped to its digits and '.', the way values like "$1,234.50" or "12 kg" were always
+# read, and keeps its minus sign when one comes before the first digit or the value is written as "(1,234)".
+def coerce_numeric(series):
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.dt.tz_localize(None) if getattr(series.dt, "tz", None) is not None else series
+        return np.where(values.isna(), np.nan, values.to_numpy("datetime64[ns]").view("int64") / 1e9)
+
+    text = series.astype(str).str.strip()
+    values = pd.to_numeric(text.str.replace(r"[^\d.]+", "", regex=True), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    negative = (text.str.match("[^0-9]*[-\u2212]") | text.str.fullmatch(r"\(.*\)")).to_numpy(dtype=bool, na_value=False)
+    values[negative] = -values[negative]
+    # Scientific notation would lose its exponent to the digit stripping above
+    scientific = text.str.fullmatch(r"[-+]?(\d+\.?\d*|\.\d+)[eE][-+]?\d+").to_numpy(dtype=bool, na_value=False)
+    if scientific.any():
+        values[scientific] = pd.to_numeric(text[scientific], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return values
+
+
+# Cleaned values per (sheet, column), so re-plotting only cleans columns it has not seen yet
+def cleaned_column(sheet, col):
+    values = app_data["cleaned"].get((sheet, col))
+    if values is None:
+        values = app_data["cleaned"][(sheet, col)] = coerce_numeric(read_columns(sheet, [col])[col])
+    return values
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+# A unit of background work; the worker reports each step, which is also where a cancel takes effect
+class Task:
+    def __init__(self, label):
+        self.step = label
+        self.started = time.perf_counter()
+        self.cancelled = threading.Event()
+
+    def report(self, step):
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+        self.step = step
+
+
+def run_task(label, work, on_done, on_error=None):
+    task = Task(label)
+    pending_tasks.append(task)
+
+    def run():
+        try:
+            task.report(label)
+            result = work(task)
+            task_results.put((task, lambda: on_done(result)))
+        except TaskCancelled:
+            task_results.put((task, None))
+        except Exception as e:
+            task_results.put((task, lambda error=e: (on_error or show_task_error)(error)))
+
+    task_executor.submit(run)
+
+
+def show_task_error(e):
+    dpg.set_value("status_text", f"Error: {e}")
+
+
+# dpg.run_callbacks has no error handling, so one failing callback would close the app. Each queued callback runs on
+# its own and its error goes to the status line; the rest of the frame's callbacks still run.
+def run_gui_callbacks():
+    for job in dpg.get_callback_queue() or []:
+        try:
+            dpg.run_callbacks([job])
+        except Exception as e:
+            show_task_error(e)
+
+
+def cancel_tasks():
+    for task in pending_tasks:
+        task.cancelled.set()
+
+
+def cancel_callback():
+    if pending_tasks:
+        cancel_tasks()
+        dpg.set_value("status_text", "Cancelled.")
+
+
+# Called once per frame on the GUI thread: apply finished results and show progress of the running task
+def process_task_results():
+    while True:
+        try:
+            task, apply = task_results.get_nowait()
+        except queue.Empty:
+            break
+        pending_tasks.remove(task)
+        # Results of a cancelled task are dropped, even if it finished its last step anyway
+        if apply is not None and not task.cancelled.is_set():
+            try:
+                apply()
+            except Exception as e:
+                show_task_error(e)
+
+    running = [task for task in pending_tasks if not task.cancelled.is_set()]
+    if running:
+        task = running[0]
+        dpg.set_value("status_text", f"{task.step}... {time.perf_counter() - task.started:.1f}s (Cancel to stop)")
+
+
+# Load a data file and populate sheets; csv, Parquet and Arrow files show up as a single sheet.
+# Only sheet names are read here, sheets themselves are parsed when chosen.
+def open_file(task, file_path):
+    kind = file_kind(file_path)
+    cancel_prefetch()
+    if kind == "excel":
+        task.report("Reading sheet names")
+        sheets = excel_sheet_names(file_path)
+        sources = {}
+    else:
+        sheets = [os.path.basename(file_path)]
+        sources = {sheets[0]: (kind, file_path)}
+
+    # The previous file's sheet is gone; Plot asks for a sheet again until one of the new file's is chosen
+    app_data["current_sheet"] = None
+    app_data["sheets"] = sheets
+    app_data["sources"] = sources
+    app_data["columns"] = {}
+    app_data["dataframes"] = OrderedDict()
+    app_data["cleaned"] = {}
+    app_data["excel_file"] = file_path
+    if kind == "excel":
+        prefetch_sheets()
+    return sheets
+
+
 def load_excel_callback(sender, file):
-    try:
-        file_path = file['file_path_name']
-        xls = pd.ExcelFile(file_path, engine='openpyxl')
-        app_data["sheets"] = xls.sheet_names
-        app_data["dataframes"] = {sheet: xls.parse(sheet) for sheet in xls.sheet_names}
-        app_data["excel_file"] = file_path
+    file_path = file['file_path_name']
 
+    def show_sheets(sheets):
         dpg.set_value("status_text", f"Loaded: {file_path}")
-        dpg.configure_item("sheet_combo", items=app_data["sheets"])
+        dpg.configure_item("sheet_combo", items=sheets)
 
-    except Exception as e:
+    def show_error(e):
         dpg.set_value("status_text", f"Error loading file: {e}")
 
+    cancel_tasks()
+    run_task(f"Opening {os.path.basename(file_path)}", lambda task: open_file(task, file_path), show_sheets, show_error)
+
+
+def sheet_columns(task, sheet):
+    columns = app_data["columns"].get(sheet)
+    if columns is None:
+        task.report(f"Converting sheet '{sheet}'")
+        columns = app_data["columns"][sheet] = schema_columns(*sheet_source(sheet))
+    prefetch_sheets(after=sheet)
+    return columns
+
+
 # When a sheet is selected, update column dropdowns and checkboxes
 def display_columns_callback(sender, app_data_local):
     sheet = dpg.get_value("sheet_combo")
-    df = app_data["dataframes"].get(sheet)
+    if sheet not in app_data["sheets"]:
+        dpg.set_value("columns_text", "Invalid sheet or no data.")
+        return
 
-    if df is not None:
-        app_data["current_df"] = df
-        dpg.set_value("columns_text", f"Columns in '{sheet}':\n{', '.join(df.columns)}")
-        dpg.configure_item("x_col_combo", items=list(df.columns))
+    def show_columns(columns):
+        app_data["current_sheet"] = sheet
+        dpg.set_value("status_text", f"Loaded sheet '{sheet}'")
+        dpg.set_value("columns_text", f"Columns in '{sheet}':\n{', '.join(columns)}")
+        dpg.configure_item("x_col_combo", items=columns)
         if dpg.does_item_exist("pie_col_combo"):
-            dpg.configure_item("pie_col_combo", items=list(df.columns))
+            dpg.configure_item("pie_col_combo", items=columns)
 
         # Clear and rebuild Y column checkboxes
         dpg.delete_item("y_col_checkboxes", children_only=True)
-        for col in df.columns:
+        for col in columns:
             dpg.add_checkbox(label=col, tag=f"ycol_chk_{col}", parent="y_col_checkboxes")
 
-    else:
+    def show_error(e):
+        dpg.set_value("status_text", f"Error loading sheet: {e}")
         dpg.set_value("columns_text", "Invalid sheet or no data.")
 
-# Generate analysis text
-def generate_basic_analysis(df, y_cols):
+    run_task(f"Loading sheet '{sheet}'", lambda task: sheet_columns(task, sheet), show_columns, show_error)
+
+# Per-column statistics over 2-D blocks of values (rows x columns, NaN = missing), fed one block at a time
+# so chunked data never has to be held at once. Sums are taken relative to each column's first value to
+# keep the variance stable. The trend slope uses a value's position among the column's valid values as x,
+# the same fit as np.polyfit(np.arange(count), values, 1), in closed form.
+class RunningStats:
+    def __init__(self, n_columns):
+        self.count = np.zeros(n_columns)
+        self.shift = np.full(n_columns, np.nan)
+        self.sum = np.zeros(n_columns)
+        self.sum_sq = np.zeros(n_columns)
+        self.sum_xy = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    def update(self, block):
+        # Work column by column on contiguous rows, so every reduction runs over contiguous memory
+        values = np.ascontiguousarray(np.asarray(block, dtype=np.float64).reshape(len(block), -1).T)
+        valid = ~np.isnan(values)
+        unset = np.isnan(self.shift) & valid.any(axis=1)
+        self.shift[unset] = values[np.flatnonzero(unset), valid.argmax(axis=1)[unset]]
+
+        centered = values - np.nan_to_num(self.shift)[:, None]
+        if valid.all():
+            x = np.arange(values.shape[1], dtype=np.float64) + self.count[:, None]
+        else:
+            centered[~valid] = 0.0
+            x = np.cumsum(valid, axis=1) - 1 + self.count[:, None]
+        self.sum += centered.sum(axis=1)
+        self.sum_sq += np.einsum("ij,ij->i", centered, centered)
+        self.sum_xy += np.einsum("ij,ij->i", x, centered)
+        self.count += valid.sum(axis=1)
+        self.min = np.fmin(self.min, np.nanmin(values, axis=1, initial=np.inf))
+        self.max = np.fmax(self.max, np.nanmax(values, axis=1, initial=-np.inf))
+        return self
+
+    def result(self):
+        n = self.count
+        empty = n == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            centered_mean = self.sum / n
+            std = np.sqrt(np.maximum((self.sum_sq - self.sum * centered_mean) / (n - 1), 0))
+            slope = (self.sum_xy - (n - 1) / 2 * self.sum) / (n * (n * n - 1) / 12)
+        return {
+            "count": n.astype(int),
+            "mean": self.shift + centered_mean,
+            "std": np.where(n > 1, std, np.nan),
+            "min": np.where(empty, np.nan, self.min),
+            "max": np.where(empty, np.nan, self.max),
+            "slope": slope,
+        }
+
+
+# Median by selection (np.partition) instead of a full sort
+def select_median(values):
+    values = values[~np.isnan(values)]
+    n = len(values)
+    if n == 0:
+        return np.nan
+    half = n // 2
+    if n % 2:
+        return np.partition(values, half)[half]
+    low, high = np.partition(values, [half - 1, half])[half - 1:half + 1]
+    return (low + high) / 2
+
+
+# All columns go through RunningStats together, in row blocks small enough for its temporaries to stay in cache
+def column_stats(columns):
+    running = RunningStats(len(columns))
+    for start in range(0, max(len(values) for values in columns), STATS_BLOCK_ROWS):
+        running.update(np.column_stack([values[start:start + STATS_BLOCK_ROWS] for values in columns]))
+    stats = running.result()
+    stats["median"] = np.array([select_median(values) for values in columns])
+    return stats
+
+
+# Generate analysis text from each column's cleaned values
+def generate_basic_analysis(y_cols, columns):
     analysis_lines = []
+    stats = column_stats(columns)
 
-    for col in y_cols:
-        col_data = pd.to_numeric(df[col], errors='coerce').dropna()
-        if col_data.empty:
+    for i, col in enumerate(y_cols):
+        count = stats["count"][i]
+        if count == 0:
             analysis_lines.append(f"• {col}: No valid numeric data.\n")
             continue
 
-        count = col_data.count()
-        mean = col_data.mean()
-        median = col_data.median()
-        std = col_data.std()
-        minimum = col_data.min()
-        maximum = col_data.max()
+        mean = stats["mean"][i]
+        median = stats["median"][i]
+        std = stats["std"][i]
+        minimum = stats["min"][i]
+        maximum = stats["max"][i]
 
         stats_text = (
             f"{col}:\n"
@@ -84,14 +467,10 @@ def generate_basic_analysis(df, y_cols):
         if std / (mean + 1e-6) > 0.5:
             insight += "\n    - Insight: High variability in data."
 
-        try:
-            x_numeric = np.arange(len(col_data))
-            slope, _ = np.polyfit(x_numeric, col_data.values, 1)
-            if abs(slope) > 0.01:
-                trend = "increasing" if slope > 0 else "decreasing"
-                insight += f"\n    - Insight: Trend is {trend}."
-        except Exception:
-            pass
+        slope = stats["slope"][i]
+        if abs(slope) > 0.01:
+            trend = "increasing" if slope > 0 else "decreasing"
+            insight += f"\n    - Insight: Trend is {trend}."
 
         analysis_lines.append(stats_text + insight + "\n")
 
@@ -99,8 +478,8 @@ def generate_basic_analysis(df, y_cols):
 
 
 def plot_callback():
-    df = app_data.get("current_df")
-    if df is None:
+    sheet = app_data.get("current_sheet")
+    if sheet is None:
         dpg.set_value("columns_text", "No data loaded.")
         return
 
@@ -110,55 +489,139 @@ def plot_callback():
         return
 
     # Gather selected Y columns from checkboxes
-    y_cols = [col for col in df.columns if dpg.does_item_exist(f"ycol_chk_{col}") and dpg.get_value(f"ycol_chk_{col}")]
+    y_cols = [col for col in app_data["columns"].get(sheet, []) if dpg.does_item_exist(f"ycol_chk_{col}") and dpg.get_value(f"ycol_chk_{col}")]
     if not y_cols:
         dpg.set_value("columns_text", "Please select at least one Y column.")
         return
 
-    try:
-        def clean_column(series):
-            return pd.to_numeric(series.astype(str).str.replace(r"[^\d.]+", "", regex=True), errors='coerce')
-
-        x_data = clean_column(df[x_col])
-        valid_mask = x_data.notna()
-        x_data = x_data[valid_mask]
-
-        if x_data.empty:
+    def show_plot(result):
+        if result is None:
             dpg.set_value("columns_text", "No valid X data to plot.")
             return
-
+        x_values, series, analysis_text = result
         dpg.delete_item("plot_area", children_only=True)
 
         with dpg.plot(label="Chart", height=300, width=-1, parent="plot_area"):
-            dpg.add_plot_axis(dpg.mvXAxis, label=x_col)
+            x_axis = dpg.add_plot_axis(dpg.mvXAxis, label=x_col)
             y_axis = dpg.add_plot_axis(dpg.mvYAxis, label="Values")
 
-            for y_col in y_cols:
-                y_data = clean_column(df[y_col])[valid_mask]
-                if y_data.empty:
-                    continue
-                dpg.add_line_series(x_data.tolist(), y_data.tolist(), label=f"{y_col}", parent=y_axis)
+            lines = []
+            for y_col, y_values in series:
+                xs, ys = minmax_decimate(x_values, y_values, -np.inf, np.inf)
+                lines.append((dpg.add_line_series(xs, ys, label=f"{y_col}", parent=y_axis), y_values))
+
+        # Full-resolution arrays stay here so zooming can re-decimate from them
+        app_data["plot"] = {"x": x_values, "x_axis": x_axis, "lines": lines, "limits": None}
 
-        # Generate and display basic analysis
-        analysis_text = generate_basic_analysis(df, y_cols)
+        # Display basic analysis
         dpg.set_value("summary_text", analysis_text)
+        dpg.set_value("status_text", f"Plotted {len(x_values):,} points from '{sheet}'")
 
-    except Exception as e:
+    def show_error(e):
+        dpg.set_value("status_text", "Plot failed.")
         dpg.set_value("columns_text", f"Plot error: {e}")
 
+    run_task("Plotting", lambda task: prepare_plot(task, sheet, x_col, y_cols), show_plot, show_error)
+
+
+# Rows with a valid X value, in ascending X order (ties keep file order), cached with the cleaned columns.
+# Plotted series are reordered by it once, so decimation can always binary-search the visible range.
+# An X column that is already sorted and complete gives slice(None), and the arrays are used without a copy.
+def plot_order(sheet, x_col):
+    key = (sheet, x_col, "order")
+    order = app_data["cleaned"].get(key)
+    if order is None:
+        x = cleaned_column(sheet, x_col)
+        valid = np.flatnonzero(~np.isnan(x))
+        x_valid = x[valid]
+        if np.all(x_valid[1:] >= x_valid[:-1]):
+            order = slice(None) if len(valid) == len(x) else valid
+        else:
+            order = valid[np.argsort(x_valid, kind="stable")]
+        app_data["cleaned"][key] = order
+    return order
+
+
+# Everything the plot needs, computed off the GUI thread; None when there is no valid X data
+def prepare_plot(task, sheet, x_col, y_cols):
+    task.report("Reading columns")
+    # Only the plotted columns are read from disk, in one read
+    read_columns(sheet, [x_col] + y_cols)
+
+    task.report(f"Cleaning '{x_col}'")
+    order = plot_order(sheet, x_col)
+    x_data = cleaned_column(sheet, x_col)[order]
+    if not len(x_data):
+        return None
+
+    series = []
+    for y_col in y_cols:
+        task.report(f"Cleaning '{y_col}'")
+        series.append((y_col, cleaned_column(sheet, y_col)[order]))
+
+    # Generate basic analysis
+    task.report("Computing statistics")
+    analysis_text = generate_basic_analysis(y_cols, [cleaned_column(sheet, col) for col in y_cols])
+    return x_data, series, analysis_text
+
+
+# Min/max bucket decimation of the points inside [lo, hi]: each bucket keeps its lowest and highest point,
+# so spikes survive at any zoom. Small ranges come back as slices of the original arrays, without a copy.
+# x must be sorted; prepare_plot orders every series by it.
+def minmax_decimate(x, y, lo, hi, buckets=PLOT_BUCKETS):
+    start = max(int(np.searchsorted(x, lo, side="left")) - 1, 0)
+    stop = min(int(np.searchsorted(x, hi, side="right")) + 1, len(x))
+    if stop - start <= 2 * buckets:
+        return x[start:stop], y[start:stop]
+
+    size = -(-(stop - start) // buckets)
+    n_full = (stop - start) // size
+    window = y[start:start + n_full * size].reshape(n_full, size)
+    low = np.argmin(np.where(np.isnan(window), np.inf, window), axis=1)
+    high = np.argmax(np.where(np.isnan(window), -np.inf, window), axis=1)
+    offsets = start + np.arange(n_full) * size
+    idx = np.stack([np.minimum(low, high), np.maximum(low, high)], axis=1) + offsets[:, None]
+    # The end points are kept too, so lines run to the edges of the view
+    idx = np.unique(np.concatenate([[start], idx.ravel(), np.arange(start + n_full * size, stop), [stop - 1]]))
+    return x[idx], y[idx]
+
+
+# Called once per frame: when the visible x range changed, redraw each series from its full-resolution data
+def refresh_plot_zoom():
+    plot = app_data["plot"]
+    if plot is None or not dpg.does_item_exist(plot["x_axis"]):
+        return
+    limits = tuple(dpg.get_axis_limits(plot["x_axis"]))
+    if plot["limits"] is None or limits == plot["limits"]:
+        # The first reading is taken before the axis has fitted the data, so it is only remembered
+        plot["limits"] = limits
+        return
+    plot["limits"] = limits
+    for line, y_values in plot["lines"]:
+        dpg.set_value(line, list(minmax_decimate(plot["x"], y_values, *limits)))
+
 
-def reset_callback():
-    app_data["current_df"] = None
+def clear_data(task):
+    cancel_prefetch()
     app_data["excel_file"] = None
     app_data["sheets"] = []
-    app_data["dataframes"] = {}
+    app_data["sources"] = {}
+    app_data["columns"] = {}
+    app_data["dataframes"] = OrderedDict()
+    app_data["cleaned"] = {}
+
+
+def reset_callback():
+    cancel_tasks()
+    run_task("Resetting", clear_data, lambda result: dpg.set_value("status_text", "Reset."))
+    app_data["current_sheet"] = None
+    app_data["plot"] = None
 
     dpg.set_value("sheet_combo", "")
     dpg.configure_item("sheet_combo", items=[])  # Clear old sheet list
     dpg.set_value("x_col_combo", "")
     dpg.configure_item("x_col_combo", items=[])
     dpg.set_value("columns_text", "")
-    dpg.set_value("status_text", "Reset.")
     dpg.set_value("summary_text", "")
     dpg.delete_item("y_col_checkboxes", children_only=True)
     dpg.delete_item("plot_area", children_only=True)
@@ -166,9 +629,11 @@ def reset_callback():
 
 # GUI Setup
 dpg.create_context()
+# Callbacks are run from the frame loop below, on the same thread that applies task results
+dpg.configure_app(manual_callback_management=True)
 
 with dpg.window(label="Excel Visualizer", width=1080, height=720):
-    dpg.add_button(label="Select Excel File", callback=lambda: dpg.show_item("file_dialog"))
+    dpg.add_button(label="Select Data File", callback=lambda: dpg.show_item("file_dialog"))
     dpg.add_text("", tag="status_text")
     dpg.add_combo([], label="Sheet", tag="sheet_combo", callback=display_columns_callback)
     dpg.add_text("", tag="columns_text")
@@ -183,6 +648,7 @@ with dpg.window(label="Excel Visualizer", width=1080, height=720):
 
     dpg.add_button(label="Plot", callback=plot_callback)
     dpg.add_button(label="Reset", callback=reset_callback)
+    dpg.add_button(label="Cancel", callback=cancel_callback)
 
     dpg.add_spacer(height=10)
     dpg.add_child_window(height=320, tag="plot_area", autosize_x=True)
@@ -206,9 +672,20 @@ with dpg.window(label="Excel Visualizer", width=1080, height=720):
     ):
         dpg.add_file_extension(".xlsx", color=(0, 255, 0, 255))
         dpg.add_file_extension(".xls", color=(255, 255, 0, 255))
+        dpg.add_file_extension(".csv", color=(0, 200, 255, 255))
+        dpg.add_file_extension(".parquet", color=(255, 128, 0, 255))
+        dpg.add_file_extension(".arrow", color=(255, 0, 255, 255))
+        dpg.add_file_extension(".feather", color=(255, 0, 255, 255))
 
 dpg.create_viewport(title='Excel Visualizer', width=1080, height=720)
 dpg.setup_dearpygui()
 dpg.show_viewport()
-dpg.start_dearpygui()
+while dpg.is_dearpygui_running():
+    run_gui_callbacks()
+    process_task_results()
+    refresh_plot_zoom()
+    dpg.render_dearpygui_frame()
 dpg.destroy_context()
+cancel_tasks()
+task_executor.shutdown(wait=False, cancel_futures=True)
+prefetch_executor.shutdown(wait=False, cancel_futures=True)